@@ -0,0 +1,277 @@
+# UniLife Optimizer ローカル HTTP/JSON API
+# GUI / Mobile / Web が同じ記録を使えるように、1つのストアを HTTP で公開する
+#
+#   python api_server.py --port 8765
+#
+# GET  /records?since=SEQ&from=YYYY-MM-DD&to=YYYY-MM-DD&limit=N
+#        since 以降に増えた記録と次に渡す seq（差分だけ取りに来られる）
+#        limit 件で打ち切ったときの seq は返した最後の記録のもの
+# POST /records                     記録1件、または記録の配列（オフライン分のまとめ送信）
+#                                   id 付きの記録・墓標は ID で突き合わせ、新しい版だけ取り込む
+# PUT  /records/<id>                記録の一部を書き換える（date / category / content / minutes）
+# DELETE /records/<id>              記録を削除する
+# GET  /aggregates/category?period=day|week|month|all   カテゴリ別の合計時間
+# GET  /aggregates/day?from=YYYY-MM-DD&to=YYYY-MM-DD    日ごとの件数・合計時間
+#
+# 集計の応答には ETag を付け、If-None-Match が一致すれば 304 を返す。
+
+import argparse
+import hashlib
+import json
+import threading
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from schema import RECORD_FIELDS, validate_record
+from stats import period_keys
+from store import DATA_FILE, RecordStore
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+PERIODS = ("day", "week", "month", "all")
+
+
+class ApiError(Exception):
+    """リクエストの誤り（status で HTTP ステータスを返す）"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _query_int(query, name, default=None):
+    if name not in query:
+        return default
+    try:
+        return int(query[name])
+    except ValueError:
+        raise ApiError(400, f"{name} must be an integer")
+
+
+def category_aggregate(store, period):
+    """カテゴリ別の合計時間（カテゴリごとの日・週・月カウンタを引くだけ）"""
+    if period not in PERIODS:
+        raise ApiError(400, f"period must be one of {', '.join(PERIODS)}")
+
+    day, week, month = period_keys(date.today())
+    # ほかのスレッドの書き込みと重ならないよう、ストアのロックの中で読む
+    with store.read():
+        if period == "all":
+            return dict(store.category_sum)
+        result = {}
+        for cat, cs in store.stats.items():
+            if period == "day":
+                mins = cs.daily.get(day, 0)
+            elif period == "week":
+                mins = cs.weekly.get(week, 0)
+            else:
+                mins = cs.monthly.get(month, 0)
+            if mins:
+                result[cat] = mins
+        return result
+
+
+def day_aggregate(store, date_from=None, date_to=None):
+    """日ごとの件数・合計時間（日付順）"""
+    lo = date.fromisoformat(date_from).toordinal() if date_from else None
+    hi = date.fromisoformat(date_to).toordinal() if date_to else None
+    with store.read():
+        days = {day: tuple(bucket) for day, bucket in store.totals.day.items()
+                if (lo is None or day >= lo) and (hi is None or day <= hi)}
+    return {
+        date.fromordinal(day).isoformat(): {"count": count, "minutes": minutes}
+        for day, (count, minutes) in sorted(days.items())
+    }
+
+
+def clean_entry(r):
+    """受け取った記録・墓標の形を確かめる
+
+    ID のない新しい記録だけ、日付がなければ今日にする（ID と更新時刻は merge で付く）。
+    同期で送られてきたもの（ID あり）は何も補わない。更新時刻がなければ一番古い版として扱う。
+    """
+    if not isinstance(r, dict):
+        raise ApiError(400, "records must be JSON objects")
+    if "id" not in r and not r.get("date"):
+        r = dict(r, date=date.today().isoformat())
+    return validate_record(r)
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    """1リクエストごとに作られるハンドラ（ストアとキャッシュはサーバー側に1つ）"""
+
+    server_version = "UniLifeAPI/1.0"
+
+    # -------------------------
+    # 応答
+    # -------------------------
+    def _send_json(self, status, data, etag=None):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self._send_body(status, body, etag)
+
+    def _send_body(self, status, body, etag=None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_cached(self, key, build):
+        """集計結果を ETag 付きで返す（記録が増えていなければ前回の結果を使い回す）"""
+        store = self.server.store
+        # 日・週・月の集計は日付が変わると変わるので、今日の日付も ETag に含める
+        version = f"{store.seq}:{date.today().isoformat()}:{key}"
+        etag = '"' + hashlib.sha1(version.encode("utf-8")).hexdigest()[:16] + '"'
+
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        with self.server.cache_lock:
+            cached = self.server.cache.get(key)
+        if cached is None or cached[0] != etag:
+            body = json.dumps(build(), ensure_ascii=False).encode("utf-8")
+            cached = (etag, body)
+            with self.server.cache_lock:
+                self.server.cache[key] = cached
+        self._send_body(200, cached[1], etag)
+
+    def _handle(self, method):
+        url = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            # ほかのプロセス（CLI など）が追記した分を取り込んでから答える
+            self.server.store.poll()
+            parts = url.path.strip("/").split("/")
+            if len(parts) == 2 and parts[0] == "records":
+                # /records/<id> は1件ずつの編集・削除
+                route = getattr(self, f"{method}_record", None)
+                args = (query, parts[1])
+            else:
+                route = getattr(self, f"{method}_{'_'.join(parts)}", None)
+                args = (query,)
+            if route is None:
+                raise ApiError(404, f"no such endpoint: {method.upper()} {url.path}")
+            route(*args)
+        except ApiError as e:
+            self._send_json(e.status, {"error": str(e)})
+        except (ValueError, KeyError) as e:
+            self._send_json(400, {"error": f"bad request: {e}"})
+
+    def do_GET(self):
+        self._handle("get")
+
+    def do_POST(self):
+        self._handle("post")
+
+    def do_PUT(self):
+        self._handle("put")
+
+    def do_DELETE(self):
+        self._handle("delete")
+
+    # -------------------------
+    # エンドポイント
+    # -------------------------
+    def get_records(self, query):
+        store = self.server.store
+        since = _query_int(query, "since", 0)
+        limit = _query_int(query, "limit")
+        if limit is not None and limit < 0:
+            raise ApiError(400, "limit must not be negative")
+        # since 以降の差分だけを見る（全件は走査しない）。
+        # limit で打ち切ったら seq は返した最後の1件のもの（そこから続きを取りに来られる）
+        records, seq = store.changes_since(since, limit)
+        # 墓標（削除）は日付を持たないので、期間を指定しても必ず含める
+        if "from" in query:
+            records = [r for r in records if r.get("deleted") or r["date"] >= query["from"]]
+        if "to" in query:
+            records = [r for r in records if r.get("deleted") or r["date"] <= query["to"]]
+        self._send_json(200, {"seq": seq, "records": records})
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"null")
+
+    def post_records(self, query):
+        payload = self._read_json()
+        records = payload if isinstance(payload, list) else [payload]
+
+        cleaned = [clean_entry(r) for r in records]
+
+        store = self.server.store
+        added = store.merge(cleaned) if cleaned else 0
+        self._send_json(201, {"added": added, "seq": store.seq})
+
+    def put_record(self, query, record_id):
+        fields = self._read_json()
+        if not isinstance(fields, dict):
+            raise ApiError(400, "body must be a JSON object")
+        # 形は書き換えた後の記録で確かめる（おかしければ 400）
+        fields = {k: v for k, v in fields.items() if k in RECORD_FIELDS}
+        try:
+            record = self.server.store.update(record_id, **fields)
+        except KeyError:
+            raise ApiError(404, f"no such record: {record_id}")
+        self._send_json(200, record)
+
+    def delete_record(self, query, record_id):
+        try:
+            self.server.store.delete(record_id)
+        except KeyError:
+            raise ApiError(404, f"no such record: {record_id}")
+        self._send_json(200, {"deleted": record_id, "seq": self.server.store.seq})
+
+    def get_aggregates_category(self, query):
+        period = query.get("period", "all")
+        self._send_cached(
+            f"category:{period}",
+            lambda: category_aggregate(self.server.store, period),
+        )
+
+    def get_aggregates_day(self, query):
+        date_from, date_to = query.get("from"), query.get("to")
+        self._send_cached(
+            f"day:{date_from}:{date_to}",
+            lambda: day_aggregate(self.server.store, date_from, date_to),
+        )
+
+
+class ApiServer(ThreadingHTTPServer):
+    """ストアと集計キャッシュを1つずつ持つ HTTP サーバー"""
+
+    daemon_threads = True
+
+    def __init__(self, address, path=DATA_FILE):
+        super().__init__(address, ApiHandler)
+        self.store = RecordStore(path)
+        self.cache = {}  # キー → (ETag, 応答の本文)
+        self.cache_lock = threading.Lock()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="UniLife Optimizer ローカル API サーバー")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--data", default=DATA_FILE, help="記録ファイル")
+    args = parser.parse_args()
+
+    server = ApiServer((args.host, args.port), args.data)
+    print(f"UniLife API: http://{args.host}:{args.port}/ （Ctrl+C で終了）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("終了します。")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,14 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import json
-import os
 from datetime import date
 import matplotlib.pyplot as plt
 
+from schema import validate_record
+from store import RecordStore
 
-DATA_FILE = "data.json"
 
-# データ読み込み
-def load_data():
-    if not os.path.exists(DATA_FILE):
-        return []
-    with open(DATA_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-# データ保存
-def save_data(records):
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(records, f, indent=2, ensure_ascii=False)
-
-def get_category_sum(records):
-    """カテゴリ別の合計時間を辞書で返す"""
-    category_sum = {}
-    for r in records:
-        cat = r["category"]
-        category_sum[cat] = category_sum.get(cat, 0) + r["minutes"]
-    return category_sum
+# ほかの画面で追加された記録を確認する間隔（ミリ秒）
+POLL_INTERVAL_MS = 2000
 
 # メインウィンドウ
 class UniLifeApp(tk.Tk):
@@ -34,9 +16,18 @@ class UniLifeApp(tk.Tk):
         super().__init__()
 
         self.title("UniLife Optimizer - GUI版")
-        self.geometry("400x300")
+        self.geometry("400x360")
+
+        self.store = RecordStore()
+        self.records = self.store.records
 
-        self.records = load_data()
+        # 形のおかしい記録は読み込まずに隔離ファイルへ移している
+        if self.store.rejected:
+            messagebox.showwarning(
+                "注意",
+                f"読み込めない記録が {len(self.store.rejected)} 件ありました。\n"
+                f"{self.store.quarantine_path} に移しています。",
+            )
 
         label = tk.Label(self, text="UniLife Optimizer GUI版", font=("Arial", 16))
         label.pack(pady=20)
@@ -50,6 +41,16 @@ class UniLifeApp(tk.Tk):
         btn_graph = tk.Button(self, text="グラフで見る", command=self.graph_menu)
         btn_graph.pack(pady=10)
 
+        btn_goal = tk.Button(self, text="目標の進み具合", command=self.goal_window)
+        btn_goal.pack(pady=10)
+
+        # ほかの画面で追加された記録を定期的に取り込む
+        self.after(POLL_INTERVAL_MS, self.poll_changes)
+
+    def poll_changes(self):
+        """ログの差分だけを読み込み、次の確認を予約する"""
+        self.store.poll()
+        self.after(POLL_INTERVAL_MS, self.poll_changes)
 
     # 記録追加の小窓
     def add_record_window(self):
@@ -70,20 +71,18 @@ class UniLifeApp(tk.Tk):
         minutes.pack()
 
         def save():
-            try:
-                minutes_val = int(minutes.get())
-            except:
-                messagebox.showerror("エラー", "時間は数字で入力して！")
-                return
-
             record = {
                 "date": date.today().isoformat(),
                 "category": category.get(),
                 "content": content.get(),
-                "minutes": minutes_val
+                "minutes": minutes.get(),
             }
-            self.records.append(record)
-            save_data(self.records)
+            # 形のチェックはストアと同じ schema.validate_record で行う
+            try:
+                self.store.append(validate_record(record))
+            except ValueError as e:
+                messagebox.showerror("エラー", str(e))
+                return
             messagebox.showinfo("保存完了", "記録を保存したよ！")
             win.destroy()
 
@@ -93,11 +92,130 @@ class UniLifeApp(tk.Tk):
     def show_records_window(self):
         win = tk.Toplevel(self)
         win.title("記録一覧")
+        win.geometry("450x400")
+
+        # 検索欄（空なら全件）
+        search_box = tk.Frame(win)
+        search_box.pack(fill="x", pady=5)
+        query = tk.Entry(search_box)
+        query.pack(side="left", fill="x", expand=True, padx=5)
+
+        results = tk.Frame(win)
+        results.pack(fill="both", expand=True)
+
+        def show(records):
+            for child in results.winfo_children():
+                child.destroy()
+            if not records:
+                tk.Label(results, text="見つかりませんでした。").pack()
+            for r in records:
+                row = tk.Frame(results)
+                row.pack(fill="x")
+                tk.Label(row, text=f"{r['date']} | {r['category']} | {r['content']} | {r['minutes']}分").pack(side="left")
+                tk.Button(row, text="削除", command=lambda r=r: delete(r)).pack(side="right")
+                tk.Button(row, text="編集", command=lambda r=r: self.edit_record_window(r, search)).pack(side="right")
+
+        def search(event=None):
+            # 転置インデックスで引くので、記録が多くても全件は見ない
+            if query.get().strip():
+                show(self.store.search(query.get(), limit=50))
+            else:
+                show(sorted(self.store.snapshot(), key=lambda r: r["date"], reverse=True))
+
+        def delete(r):
+            if messagebox.askyesno("確認", f"「{r['content']}」を削除する？", parent=win):
+                try:
+                    self.store.delete(r["id"])
+                except KeyError:
+                    messagebox.showerror("エラー", "ほかの画面で削除された記録です。", parent=win)
+                search()
+
+        tk.Button(search_box, text="検索", command=search).pack(side="right", padx=5)
+        query.bind("<Return>", search)
+
+        search()
+
+    # 記録編集の小窓
+    def edit_record_window(self, record, on_done):
+        win = tk.Toplevel(self)
+        win.title("記録を編集")
+        win.geometry("300x300")
+
+        entries = {}
+        for key, label in (("date", "日付"), ("category", "カテゴリ"), ("content", "内容"), ("minutes", "時間（分）")):
+            tk.Label(win, text=label).pack()
+            entry = tk.Entry(win)
+            entry.insert(0, str(record[key]))
+            entry.pack()
+            entries[key] = entry
+
+        def save():
+            # 書き換えた後の記録をストアが schema.validate_record で確かめる
+            try:
+                self.store.update(record["id"], **{key: entry.get() for key, entry in entries.items()})
+            except ValueError as e:
+                messagebox.showerror("エラー", str(e))
+                return
+            except KeyError:
+                messagebox.showerror("エラー", "ほかの画面で削除された記録です。")
+                win.destroy()
+                on_done()
+                return
+            messagebox.showinfo("保存完了", "記録を更新したよ！")
+            win.destroy()
+            on_done()
+
+        tk.Button(win, text="保存", command=save).pack(pady=10)
+
+    # 目標の進み具合と設定
+    def goal_window(self):
+        win = tk.Toplevel(self)
+        win.title("目標の進み具合")
         win.geometry("350x400")
 
-        for r in self.records:
-            tk.Label(win, text=f"{r['date']} | {r['category']} | {r['content']} | {r['minutes']}分").pack()
-            
+        progress = self.store.goal_progress()
+        if not progress:
+            tk.Label(win, text="目標はまだありません。下から設定してね。").pack(pady=10)
+
+        # カウンタを引くだけなので、記録が多くてもすぐ表示できる
+        for g in progress:
+            label = "今週" if g["period"] == "weekly" else "今月"
+            tk.Label(win, text=f"{g['category']}（{label}）: {g['done']} / {g['target']} 分").pack()
+            bar = ttk.Progressbar(win, length=250, maximum=100)
+            bar["value"] = min(g["ratio"], 1.0) * 100
+            bar.pack(pady=(0, 5))
+
+        ttk.Separator(win).pack(fill="x", pady=10)
+
+        tk.Label(win, text="カテゴリ").pack()
+        category = tk.Entry(win)
+        category.pack()
+
+        period = ttk.Combobox(win, values=["週", "月"], state="readonly", width=5)
+        period.current(0)
+        period.pack(pady=5)
+
+        tk.Label(win, text="目標時間（分・0で解除）").pack()
+        minutes = tk.Entry(win)
+        minutes.pack()
+
+        def save():
+            try:
+                minutes_val = int(minutes.get())
+            except ValueError:
+                messagebox.showerror("エラー", "時間は数字で入力して！")
+                return
+            if not category.get():
+                messagebox.showerror("エラー", "カテゴリを入力して！")
+                return
+
+            goal_period = "weekly" if period.get() == "週" else "monthly"
+            self.store.set_target(category.get(), goal_period, minutes_val)
+            messagebox.showinfo("保存完了", "目標を保存したよ！")
+            win.destroy()
+
+        tk.Button(win, text="保存", command=save).pack(pady=10)
+
     def graph_menu(self):
         if not self.records:
             messagebox.showinfo("情報", "まだ記録がありません。先に記録を追加してね。")
@@ -116,7 +234,8 @@ class UniLifeApp(tk.Tk):
         if not self.records:
             return
 
-        category_sum = get_category_sum(self.records)
+        with self.store.read():
+            category_sum = dict(self.store.category_sum)
         categories = list(category_sum.keys())
         minutes = list(category_sum.values())
 
@@ -132,7 +251,8 @@ class UniLifeApp(tk.Tk):
         if not self.records:
             return
 
-        category_sum = get_category_sum(self.records)
+        with self.store.read():
+            category_sum = dict(self.store.category_sum)
         categories = list(category_sum.keys())
         minutes = list(category_sum.values())
 
@@ -1,38 +1,29 @@
 # UniLife Optimizer v0.2
 # JSON保存対応版
-
+#
+# 引数なしで起動すると対話メニュー、サブコマンド付きなら1回だけ実行して終了する。
+#   python main.py add --category IT --content 過去問 --minutes 30
+#   python main.py list --since 2025-11-01 --limit 20 --format csv
+#   python main.py summary --period week
+#   python main.py export --format csv > records.csv
+#   python main.py import records.json
+#   python main.py stats
+#   python main.py check
+#   python main.py edit <ID> --minutes 45
+#   python main.py delete <ID>
+#   python main.py sync http://192.168.0.10:8765
+
+import argparse
+import csv
+import io
 import json
 import os
+import sys
 from datetime import date
-import matplotlib.pyplot as plt
-
-DATA_FILE = "data.json"
-
-
-def load_data():
-    """アプリ起動時にJSONファイルを読み込む"""
-    if not os.path.exists(DATA_FILE):
-        return []  # ファイルがなければ空リスト
-
-    with open(DATA_FILE, "r", encoding="utf-8") as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            return []  # 壊れてても一旦空でOK
-
 
-def save_data(records):
-    """記録をJSONファイルに保存"""
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(records, f, indent=2, ensure_ascii=False)
-
-def get_category_sum(records):
-    """カテゴリ別の合計を返す"""
-    category_sum = {}
-    for r in records:
-        cat = r["category"]
-        category_sum[cat] = category_sum.get(cat, 0) + r["minutes"]
-    return category_sum
+from schema import parse_date, parse_minutes, validate_record
+from stats import period_keys
+from store import RecordStore, append_records, get_category_sum, read_records
 
 def visualize_bar(records):
     if not records:
@@ -43,6 +34,8 @@ def visualize_bar(records):
     categories = list(category_sum.keys())
     minutes = list(category_sum.values())
 
+    import matplotlib.pyplot as plt  # グラフを出すときだけ読み込む（起動を速くする）
+
     plt.figure()
     plt.bar(categories, minutes)
     plt.xlabel("category")
@@ -60,6 +53,8 @@ def visualize_pie(records):
     categories = list(category_sum.keys())
     minutes = list(category_sum.values())
 
+    import matplotlib.pyplot as plt
+
     plt.figure()
     plt.pie(minutes, labels=categories, autopct="%1.1f%%", startangle=90)
     plt.title("category vs time (pie chart)")
@@ -86,12 +81,6 @@ def graph_menu(records):
             print("1～3で選んでね。\n")
 
 
-def get_todays_records(records):
-    """今日の記録だけを抽出して返す"""
-    today = date.today().isoformat()
-    return [r for r in records if r["date"] == today]
-
-
 def show_menu():
     print("===================================")
     print("   UniLife Optimizer v0.5")
@@ -101,13 +90,16 @@ def show_menu():
     print("3) 集計を見る")
     print("4) 今日やるべきことの提案を見る")
     print("5) グラフで学習状況を見る")
-    print("6) 終了する")
+    print("6) 目標時間を設定する")
+    print("7) 記録を検索する")
+    print("8) 記録を編集・削除する")
+    print("9) 終了する")
     print("===================================")
 
 
 
 
-def add_record(records):
+def add_record(store):
     print("\n--- 新しい記録を追加 ---")
 
     today_str = date.today().isoformat()
@@ -120,12 +112,11 @@ def add_record(records):
     content = input("内容：").strip()
 
     while True:
-        minutes_str = input("時間（分）：").strip()
         try:
-            minutes = int(minutes_str)
+            minutes = parse_minutes(input("時間（分）：").strip())
             break
-        except ValueError:
-            print("数字で入力してね。")
+        except ValueError as e:
+            print(e)
 
     record = {
         "date": input_date,
@@ -134,8 +125,12 @@ def add_record(records):
         "minutes": minutes,
     }
 
-    records.append(record)
-    save_data(records)
+    # 日付などの形はストアが schema.validate_record で確かめる
+    try:
+        store.append(record)
+    except ValueError as e:
+        print(f"\n保存できませんでした：{e}\n")
+        return
 
     print("\n✅ 記録を保存しました！\n")
 
@@ -158,26 +153,110 @@ def show_records(records):
 
     print()
 
-def suggest_today(records):
+def edit_record(store):
+    print("\n--- 記録を編集・削除（最新10件から選ぶ） ---")
+
+    if not store.records:
+        print("まだ記録がありません。\n")
+        return
+
+    recent = sorted(store.snapshot(), key=lambda r: r["date"], reverse=True)[:10]
+    for i, r in enumerate(recent, start=1):
+        print(f"[{i}] {r['date']} | {r['category']} | {r['content']} | {r['minutes']}分")
+
+    choice = input("番号（Enterで戻る）：").strip()
+    if not choice.isdigit() or not 1 <= int(choice) <= len(recent):
+        print("戻ります。\n")
+        return
+    target = recent[int(choice) - 1]
+
+    action = input("e) 編集する  d) 削除する：").strip().lower()
+    if action == "d":
+        try:
+            store.delete(target["id"])
+        except KeyError as e:
+            print(f"\n削除できませんでした：{e}\n")
+            return
+        print("\n🗑 記録を削除しました！\n")
+        return
+    if action != "e":
+        print("戻ります。\n")
+        return
+
+    # 空のまま Enter ならその項目は変えない
+    fields = {}
+    for key, label in (("date", "日付"), ("category", "種類"), ("content", "内容")):
+        value = input(f"{label}（いま: {target[key]}）：").strip()
+        if value:
+            fields[key] = value
+    while True:
+        minutes_str = input(f"時間（分）（いま: {target['minutes']}）：").strip()
+        if not minutes_str:
+            break
+        try:
+            fields["minutes"] = parse_minutes(minutes_str)
+            break
+        except ValueError as e:
+            print(e)
+
+    if fields:
+        try:
+            store.update(target["id"], **fields)
+        except (KeyError, ValueError) as e:
+            print(f"\n更新できませんでした：{e}\n")
+            return
+        print("\n✅ 記録を更新しました！\n")
+    else:
+        print("変更はありません。\n")
+
+
+def search_records(store):
+    print("\n--- 記録を検索 ---")
+
+    query = input("キーワード（カテゴリ・内容／空白区切りで絞り込み）：").strip()
+    if not query:
+        print("キーワードが空なので戻ります。\n")
+        return
+
+    # 転置インデックスで引くので、記録が多くても全件は見ない
+    results = store.search(query, limit=20)
+    if not results:
+        print("見つかりませんでした。\n")
+        return
+
+    print("\n見つかった記録（新しい順・最大20件）：")
+    for i, r in enumerate(results, start=1):
+        print(f"[{i}] {r['date']} | {r['category']} | {r['content']} | {r['minutes']}分")
+
+    print()
+
+def suggest_today(store):
     print("\n--- 今日やるべきことの提案 ---")
 
-    if not records:
+    if not store.records:
         print("まだ記録がありません。まずは何か1つ記録してみよう！\n")
         return
 
-    # カテゴリ別の累計時間を集計
-    category_sum = get_category_sum(records)
+    # 週の目標に対して不足が大きい順（目標なしのカテゴリはふだんのペースと比べる）
+    ranking = store.recommend()
 
-    # 一番時間が少ないカテゴリを探す
-    least_cat = min(category_sum, key=category_sum.get)
-    least_minutes = category_sum[least_cat]
+    print("\n直近7日の時間（カテゴリ別・不足が大きい順）：")
+    for row in ranking:
+        mark = "目標" if row["has_target"] else "ふだん"
+        # 目標だけあってまだ記録のないカテゴリは streak / days_since が None
+        streak = f" / {row['streak']}日連続🔥" if (row["streak"] or 0) >= 2 else ""
+        last = "まだ記録なし" if row["days_since"] is None else f"{row['days_since']}日前"
+        print(f"  - {row['category']}: {row['last7']} / {row['target']} 分（{mark}）"
+              f" | 30日: {row['last30']} 分 | 最終: {last}{streak}")
 
-    print("\nこれまでの累計時間（カテゴリ別）：")
-    for cat, mins in category_sum.items():
-        print(f"  - {cat}: {mins} 分")
+    top = ranking[0]
+    least_cat = top["category"]
 
-    print("\n👀 一番時間を使えていないのは…")
-    print(f"➡ {least_cat}（{least_minutes} 分）")
+    print("\n👀 いま一番足りていないのは…")
+    if top["deficit"] > 0:
+        print(f"➡ {least_cat}（今週あと {top['deficit']} 分）")
+    else:
+        print(f"➡ {least_cat}（どのカテゴリも目標ペースを満たしています）")
 
     # カテゴリごとにちょっとだけコメント
     print("\n💡 今日のおすすめ：")
@@ -193,49 +272,369 @@ def suggest_today(records):
     print()
 
 
-def show_summary(records):
-    print("\n--- 集計（今日・累計） ---")
+# 目標の種類 → 表示名
+GOAL_PERIOD_LABELS = {"weekly": "週", "monthly": "月"}
 
-    if not records:
-        print("まだ記録がありません。\n")
+
+def set_goal(store):
+    print("\n--- 目標時間を設定 ---")
+
+    for period, label in GOAL_PERIOD_LABELS.items():
+        for cat, mins in store.goals[period].items():
+            print(f"  - {cat}: {label} {mins} 分")
+
+    category = input("カテゴリ：").strip()
+    if not category:
+        print("カテゴリが空なので戻ります。\n")
+        return
+
+    while True:
+        kind = input("1) 週の目標  2) 月の目標：").strip()
+        if kind in ("1", "2"):
+            period = "weekly" if kind == "1" else "monthly"
+            break
+        print("1か2で選んでね。")
+
+    while True:
+        minutes_str = input(f"{GOAL_PERIOD_LABELS[period]}の目標時間（分・0で解除）：").strip()
+        try:
+            minutes = int(minutes_str)
+            break
+        except ValueError:
+            print("数字で入力してね。")
+
+    store.set_target(category, period, minutes)
+    print("\n✅ 目標を保存しました！\n")
+
+
+def show_goal_progress(store):
+    """目標ごとの今週・今月の進み具合を表示する"""
+    progress = store.goal_progress()
+    if not progress:
+        print("\n目標はまだありません（メニュー6で設定できます）。")
         return
 
-    # 今日だけの記録
-    todays = get_todays_records(records)
+    print("\n🎯 目標の進み具合：")
+    for g in progress:
+        label = "今週" if g["period"] == "weekly" else "今月"
+        bar = "█" * min(int(g["ratio"] * 10), 10)
+        print(f"  - {g['category']}（{label}）: {g['done']} / {g['target']} 分"
+              f" [{bar:<10}] {g['ratio']:.0%}")
 
-    # 累計のカテゴリ別
-    total_category = get_category_sum(records)
 
+def show_summary(store):
+    print("\n--- 集計（今日・累計） ---")
 
+    if not store.records:
+        print("まだ記録がありません。\n")
+        return
 
+    # 裏のまとめ直しが集計を書き換えることがあるので、ロックの中で読む
+    with store.read():
+        # 今日だけの記録（カウンタを引くだけで全件は見ない）
+        count, minutes = store.totals.get("day")
+        print(f"\n今日：{count} 件 / {minutes} 分")
+        today = date.today().toordinal()
+        for cat, cs in store.stats.items():
+            mins = cs.daily.get(today)
+            if mins:
+                print(f"  - {cat}: {mins} 分")
+
+        # 累計のカテゴリ別
+        print(f"\n累計：{store.totals.count} 件 / {store.totals.minutes} 分")
+        for cat, mins in store.category_sum.items():
+            print(f"  - {cat}: {mins} 分")
+
+    show_goal_progress(store)
+    print()
 
 
 def main():
     print("UniLife Optimizer を起動中…")
 
-    # 起動時に保存データ読み込み
-    records = load_data()
+    # 起動時に保存データ読み込み（以降はログの差分だけ取り込む）
+    store = RecordStore()
+    if store.rejected:
+        print(f"⚠ 読み込めない記録が {len(store.rejected)} 件ありました（{store.quarantine_path} に移しています）。")
 
     while True:
+        # ほかの画面で追加された記録があれば取り込む
+        changes = store.poll()
+        if changes:
+            print(f"🔄 ほかの画面での追加・編集・削除を {len(changes)} 件読み込みました。\n")
+
         show_menu()
         choice = input("番号を選んでください：").strip()
 
         if choice == "1":
-            add_record(records)
+            add_record(store)
         elif choice == "2":
-            show_records(records)
+            show_records(store.snapshot())
         elif choice == "3":
-            show_summary(records)
+            show_summary(store)
         elif choice == "4":
-            suggest_today(records)
+            suggest_today(store)
         elif choice == "5":
-            graph_menu(records)
+            graph_menu(store.snapshot())
         elif choice == "6":
+            set_goal(store)
+        elif choice == "7":
+            search_records(store)
+        elif choice == "8":
+            edit_record(store)
+        elif choice == "9":
             print("終了します。おつかれ！")
             break
         else:
-            print("1〜6で選んでね。\n")
+            print("1〜9で選んでね。\n")
+
+
+# -------------------------
+# サブコマンド（スクリプト・cron 用）
+# 結果は JSON（list / export は CSV も可）で標準出力に出す
+# -------------------------
+CSV_FIELDS = ["date", "category", "content", "minutes", "id"]
+
+
+def print_json(data, out=None):
+    out = out or sys.stdout
+    json.dump(data, out, indent=2, ensure_ascii=False)
+    out.write("\n")
+
+
+def print_records(records, fmt, out=None):
+    if fmt == "csv":
+        writer = csv.writer(out or sys.stdout, lineterminator="\n")
+        writer.writerow(CSV_FIELDS)
+        for r in records:
+            writer.writerow([r[k] for k in CSV_FIELDS])
+    else:
+        print_json(records, out)
+
+
+def cmd_add(args):
+    # 既存の記録は読まず、ログに1行足すだけ
+    record = {
+        "date": args.date,
+        "category": args.category,
+        "content": args.content,
+        "minutes": args.minutes,
+    }
+    try:
+        written = append_records([record])
+    except ValueError as e:
+        sys.exit(str(e))
+    print_json(written[0])
+
+
+def cmd_list(args):
+    # 記録だけ読む（集計・検索インデックスは作らない）
+    since = None
+    if args.since:
+        try:
+            since = parse_date(args.since).isoformat()
+        except ValueError as e:
+            sys.exit(str(e))
+    records = read_records()
+    if since:
+        records = [r for r in records if r["date"] >= since]
+    records.sort(key=lambda r: r["date"], reverse=True)
+    if args.limit is not None:
+        records = records[:args.limit]
+    print_records(records, args.format)
+
+
+def cmd_summary(args):
+    store = RecordStore()
+    count, minutes = store.totals.get(args.period)
+
+    # カテゴリ別はカテゴリごとの日・週・月カウンタを引くだけ
+    day, week, month = period_keys(date.today())
+    categories = {}
+    for cat, cs in store.stats.items():
+        if args.period == "all":
+            mins = cs.total
+        elif args.period == "day":
+            mins = cs.daily.get(day, 0)
+        elif args.period == "week":
+            mins = cs.weekly.get(week, 0)
+        else:
+            mins = cs.monthly.get(month, 0)
+        if mins:
+            categories[cat] = mins
+
+    print_json({
+        "period": args.period,
+        "count": count,
+        "minutes": minutes,
+        "categories": categories,
+        "goals": store.goal_progress(),
+    })
+
+
+def cmd_export(args):
+    records = read_records()
+    if args.output:
+        with open(args.output, "w", encoding="utf-8", newline="") as f:
+            print_records(records, args.format, f)
+    else:
+        print_records(records, args.format)
+
+
+def read_import_file(path, encoding=None):
+    """取り込むファイルを文字列で読む（文字コードの指定がなければ UTF-8 → cp932 の順に試す）
+
+    Web から書き出した CSV は cp932 のことがある。読めなければメッセージを出して終了する。
+    """
+    for enc in [encoding] if encoding else ["utf-8-sig", "cp932"]:
+        try:
+            with open(path, "r", encoding=enc, newline="") as f:
+                return f.read()
+        except UnicodeDecodeError:
+            continue
+        except LookupError:
+            sys.exit(f"知らない文字コードです：{enc}")
+        except OSError as e:
+            sys.exit(f"{path}: 読み込めませんでした：{e}")
+    sys.exit(f"{path}: 文字コードが読めません（--encoding で指定して！）")
+
+
+def cmd_import(args):
+    # JSON（記録の配列）か CSV（ヘッダー付き）をまとめてログに追記する
+    text = read_import_file(args.file, args.encoding)
+    if os.path.splitext(args.file)[1].lower() == ".csv":
+        rows = list(csv.DictReader(io.StringIO(text, newline="")))
+    else:
+        try:
+            rows = json.loads(text)
+        except ValueError as e:
+            sys.exit(f"{args.file}: JSON として読めません：{e}")
+        if not isinstance(rows, list):
+            sys.exit(f"{args.file}: 記録の配列になっていません")
+
+    records = []
+    for i, row in enumerate(rows, start=1):
+        # export したものを読み直す場合は ID を引き継ぐ（読み込み時に重複は除かれる）
+        # CSV の空欄は項目なしとして扱う
+        if isinstance(row, dict):
+            row = {k: v for k, v in row.items() if v != ""}
+        try:
+            records.append(validate_record(row))
+        except ValueError as e:
+            sys.exit(f"{args.file}: {i}件目: {e}")
+    append_records(records)
+    print_json({"imported": len(records)})
+
+
+def cmd_stats(args):
+    store = RecordStore()
+    print_json({
+        "records": store.totals.count,
+        "minutes": store.totals.minutes,
+        "recommend": store.recommend(),
+        "goals": store.goal_progress(),
+    })
+
+
+def cmd_edit(args):
+    fields = {k: getattr(args, k) for k in ("date", "category", "content", "minutes")
+              if getattr(args, k) is not None}
+    try:
+        print_json(RecordStore().update(args.id, **fields))
+    except KeyError:
+        sys.exit(f"no such record: {args.id}")
+    except ValueError as e:
+        sys.exit(str(e))
+
+
+def cmd_delete(args):
+    try:
+        RecordStore().delete(args.id)
+    except KeyError:
+        sys.exit(f"no such record: {args.id}")
+    print_json({"deleted": args.id})
+
+
+def cmd_check(args):
+    # 読み込みと同時に、形のおかしい記録は隔離ファイルへ移される
+    store = RecordStore()
+    print_json({
+        "records": len(store.records),
+        "rejected": len(store.rejected),
+        "quarantine": store.quarantine_path,
+        "report": [
+            {k: r[k] for k in ("source", "position", "reason")} for r in store.rejected
+        ],
+    })
+
+
+def cmd_sync(args):
+    from sync import sync_with  # urllib などは同期するときだけ読み込む
+
+    print_json(sync_with(args.peer))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="UniLife Optimizer（引数なしで対話メニュー）",
+    )
+    sub = parser.add_subparsers(dest="command")
+
+    p = sub.add_parser("add", help="記録を1件追加する")
+    p.add_argument("--date", default=date.today().isoformat(), help="日付（省略時は今日）")
+    p.add_argument("--category", required=True)
+    p.add_argument("--content", required=True)
+    p.add_argument("--minutes", type=int, required=True)
+    p.set_defaults(func=cmd_add)
+
+    p = sub.add_parser("list", help="記録を新しい順に出す")
+    p.add_argument("--since", help="この日付（YYYY-MM-DD）以降だけ")
+    p.add_argument("--limit", type=int, help="最大件数")
+    p.add_argument("--format", choices=["json", "csv"], default="json")
+    p.set_defaults(func=cmd_list)
+
+    p = sub.add_parser("summary", help="期間の件数・時間・目標の進み具合")
+    p.add_argument("--period", choices=["day", "week", "month", "all"], default="all")
+    p.set_defaults(func=cmd_summary)
+
+    p = sub.add_parser("export", help="全記録を書き出す")
+    p.add_argument("--format", choices=["json", "csv"], default="json")
+    p.add_argument("--output", help="出力ファイル（省略時は標準出力）")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("import", help="JSON / CSV の記録をまとめて追加する")
+    p.add_argument("file")
+    p.add_argument("--encoding", help="文字コード（省略時は UTF-8、読めなければ cp932）")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("stats", help="おすすめ順のカテゴリ統計と目標の進み具合")
+    p.set_defaults(func=cmd_stats)
+
+    p = sub.add_parser("edit", help="記録の一部を書き換える（ID は list で確認）")
+    p.add_argument("id")
+    p.add_argument("--date")
+    p.add_argument("--category")
+    p.add_argument("--content")
+    p.add_argument("--minutes", type=int)
+    p.set_defaults(func=cmd_edit)
+
+    p = sub.add_parser("delete", help="記録を削除する")
+    p.add_argument("id")
+    p.set_defaults(func=cmd_delete)
+
+    p = sub.add_parser("check", help="記録の形を確かめ、読み込めないものを隔離して報告する")
+    p.set_defaults(func=cmd_check)
+
+    p = sub.add_parser("sync", help="別の記録ファイル・API サーバーと差分だけ同期する")
+    p.add_argument("peer", help="記録ファイルのパス、または http://... の URL")
+    p.set_defaults(func=cmd_sync)
+
+    return parser
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = build_parser().parse_args()
+    if args.command is None:
+        main()
+    else:
+        args.func(args)
\ No newline at end of file
@@ -1,8 +1,9 @@
 
-import json
 import os
+import threading
 from datetime import date
 import matplotlib.pyplot as plt
+from kivy.clock import Clock
 from kivy.uix.image import Image
 from kivy.app import App
 from kivy.uix.boxlayout import BoxLayout
@@ -12,29 +13,14 @@ from kivy.uix.button import Button
 from kivy.uix.scrollview import ScrollView
 from kivy.uix.gridlayout import GridLayout
 
-DATA_FILE = "data.json"
+from store import RecordStore
+from sync import open_peer, sync
 
+# ほかの画面で追加された記録を確認する間隔（秒）
+POLL_INTERVAL_SEC = 2
 
-def load_data():
-    if not os.path.exists(DATA_FILE):
-        return []
-    with open(DATA_FILE, "r", encoding="utf-8") as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            return []
-
-
-def save_data(records):
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(records, f, indent=2, ensure_ascii=False)
-
-def get_category_sum(records):
-    category_sum = {}
-    for r in records:
-        cat = r["category"]
-        category_sum[cat] = category_sum.get(cat, 0) + r["minutes"]
-    return category_sum
+# 同期相手（api_server.py の URL か、記録ファイルのパス）
+SYNC_PEER = os.environ.get("UNILIFE_SYNC_PEER", "sync_peer.json")
 
 class UniLifeRoot(BoxLayout):
     def show_pie_graph(self, instance):
@@ -42,7 +28,8 @@ class UniLifeRoot(BoxLayout):
             return
 
         # カテゴリ別合計
-        category_sum = get_category_sum(self.records)
+        with self.store.read():
+            category_sum = dict(self.store.category_sum)
         categories = list(category_sum.keys())
         minutes = list(category_sum.values())
 
@@ -77,7 +64,8 @@ class UniLifeRoot(BoxLayout):
             return
 
         # カテゴリ別合計
-        category_sum = get_category_sum(self.records)
+        with self.store.read():
+            category_sum = dict(self.store.category_sum)
         categories = list(category_sum.keys())
         minutes = list(category_sum.values())
 
@@ -111,7 +99,12 @@ class UniLifeRoot(BoxLayout):
     def __init__(self, **kwargs):
         super().__init__(orientation="vertical", padding=10, spacing=10, **kwargs)
 
-        self.records = load_data()
+        self.store = RecordStore()
+        self.records = self.store.records
+        # 編集中の記録の ID（None なら新規追加）
+        self.editing_id = None
+        # 同期中は同期ボタンを受け付けない
+        self.syncing = False
 
         # タイトル
         self.add_widget(Label(text="UniLife Optimizer - Mobile", font_size=24, size_hint_y=None, height=40))
@@ -147,6 +140,17 @@ class UniLifeRoot(BoxLayout):
         pie_button.bind(on_press=self.show_pie_graph)
         self.add_widget(pie_button)
 
+        # 同期ボタン（前回から増えた記録だけをやりとりする）
+        sync_button = Button(text="sync", size_hint_y=None, height=40)
+        sync_button.bind(on_press=self.on_sync)
+        self.add_widget(sync_button)
+
+        self.status_label = Label(text="", size_hint_y=None, height=30)
+        if self.store.rejected:
+            # 形のおかしい記録は読み込まずに隔離ファイルへ移している
+            self.status_label.text = f"{len(self.store.rejected)} bad records moved to {self.store.quarantine_path}"
+        self.add_widget(self.status_label)
+
         scroll = ScrollView(size_hint=(1, 1))
         scroll.add_widget(self.records_area)
         self.add_widget(scroll)
@@ -155,6 +159,11 @@ class UniLifeRoot(BoxLayout):
         # 初期表示
         self.refresh_records_view()
 
+        # 新しい記録は一覧の先頭に差し込むだけ（全部は作り直さない）
+        # 同期のスレッドから呼ばれることもあるので、画面の更新は Clock で UI スレッドに回す
+        self.store.subscribe(lambda changes: Clock.schedule_once(lambda dt: self.on_changes(changes)))
+        Clock.schedule_interval(lambda dt: self.store.poll(), POLL_INTERVAL_SEC)
+
     def on_save(self, instance):
         cat = self.category_input.text.strip()
         content = self.content_input.text.strip()
@@ -164,41 +173,113 @@ class UniLifeRoot(BoxLayout):
             # 本当はポップアップとかでエラーを出したいが、まずは簡単にスルー
             return
 
+        # 時間などの形はストアが schema.validate_record で確かめる
         try:
-            mins = int(mins_text)
+            if self.editing_id is not None:
+                # 編集中なら日付はそのままで、ほかの項目だけ書き換える
+                self.store.update(self.editing_id, category=cat, content=content, minutes=mins_text)
+            else:
+                record = {
+                    "date": date.today().isoformat(),
+                    "category": cat,
+                    "content": content,
+                    "minutes": mins_text,
+                }
+                self.store.append(record)
         except ValueError:
+            # Kivy の標準フォントは日本語を出せないので、メッセージは英語で
+            self.status_label.text = "invalid input: time must be a number"
             return
-
-        record = {
-            "date": date.today().isoformat(),
-            "category": cat,
-            "content": content,
-            "minutes": mins,
-        }
-
-        self.records.append(record)
-        save_data(self.records)
+        except KeyError:
+            # ほかの画面で消されていた
+            self.status_label.text = "record was deleted"
+        self.editing_id = None
 
         # 入力欄クリア
         self.category_input.text = ""
         self.content_input.text = ""
         self.minutes_input.text = ""
 
-        # 再描画
-        self.refresh_records_view()
+    def on_sync(self, instance):
+        if self.syncing:
+            return
+        self.syncing = True
+        self.status_label.text = "syncing..."
+        # 通信は相手の応答を最大10秒待つので、画面を止めないよう裏のスレッドで
+        threading.Thread(target=self.run_sync, daemon=True).start()
+
+    def run_sync(self):
+        try:
+            result = sync(self.store, open_peer(SYNC_PEER))
+        except (OSError, ValueError) as e:
+            # オフライン・相手の応答が壊れているときは、次に押したときにまとめて送る
+            message = f"sync failed: {e}"
+        else:
+            message = f"sync: sent {result['sent']} / received {result['received']}"
+        Clock.schedule_once(lambda dt: self.finish_sync(message))
+
+    def finish_sync(self, message):
+        self.syncing = False
+        self.status_label.text = message
 
     def refresh_records_view(self):
         # いったん全部消す
         self.records_area.clear_widgets()
 
         # 新しい順に表示
-        sorted_records = sorted(self.records, key=lambda r: r["date"], reverse=True)
+        sorted_records = sorted(self.store.snapshot(), key=lambda r: r["date"], reverse=True)
 
         for r in sorted_records:
-            text = f"{r['date']} | {r['category']} | {r['content']} | {r['minutes']}minutes"
-            lbl = Label(text=text, size_hint_y=None, height=30, halign="left", valign="middle")
-            lbl.bind(size=lambda inst, _: setattr(inst, "text_size", inst.size))
-            self.records_area.add_widget(lbl)
+            self.records_area.add_widget(self.make_record_label(r))
+
+    def make_record_label(self, r):
+        row = BoxLayout(orientation="horizontal", size_hint_y=None, height=30, spacing=5)
+
+        text = f"{r['date']} | {r['category']} | {r['content']} | {r['minutes']}minutes"
+        lbl = Label(text=text, halign="left", valign="middle")
+        lbl.bind(size=lambda inst, _: setattr(inst, "text_size", inst.size))
+        row.add_widget(lbl)
+
+        edit_btn = Button(text="edit", size_hint_x=None, width=60)
+        edit_btn.bind(on_press=lambda x: self.start_edit(r["id"]))
+        row.add_widget(edit_btn)
+
+        delete_btn = Button(text="del", size_hint_x=None, width=60)
+        delete_btn.bind(on_press=lambda x: self.on_delete(r["id"]))
+        row.add_widget(delete_btn)
+        return row
+
+    def start_edit(self, record_id):
+        """記録の内容を入力欄に入れ、save で上書きできるようにする"""
+        r = self.store.get(record_id)
+        if r is None:
+            return
+        self.editing_id = record_id
+        self.category_input.text = r["category"]
+        self.content_input.text = r["content"]
+        self.minutes_input.text = str(r["minutes"])
+        self.status_label.text = f"editing: {r['date']} {r['category']}"
+
+    def on_delete(self, record_id):
+        try:
+            self.store.delete(record_id)
+        except KeyError:
+            # ほかの画面ですでに消されていた
+            pass
+        if self.editing_id == record_id:
+            self.editing_id = None
+
+    def on_changes(self, changes):
+        """ストアに反映された変更を一覧に映す
+
+        追加だけなら先頭に差し込み、編集・削除があれば一覧を作り直す。
+        """
+        if any(old is not None for old, new in changes):
+            self.refresh_records_view()
+            return
+        for old, new in changes:
+            # Kivy は children の末尾が画面の一番上
+            self.records_area.add_widget(self.make_record_label(new), index=len(self.records_area.children))
 
 
 class UniLifeMobileApp(App):
@@ -0,0 +1,109 @@
+# UniLife Optimizer 記録の形式チェック
+# 読み込み・書き込みのときに1回だけ確かめて型をそろえ、集計では確かめ直さない
+
+from datetime import date
+
+from stats import period_keys
+
+# 記録の項目（これ以外の項目は読み込み時に落とす）
+RECORD_FIELDS = ("date", "category", "content", "minutes")
+
+
+def parse_date(value):
+    """YYYY-MM-DD の文字列を date にする（おかしければ ValueError）"""
+    if isinstance(value, str):
+        try:
+            return date.fromisoformat(value.strip())
+        except ValueError:
+            pass
+    raise ValueError(f"日付は YYYY-MM-DD で入力して！（{value!r}）")
+
+
+def parse_minutes(value):
+    """時間（分）を0以上の整数にする（数字の文字列も受け付ける）"""
+    if isinstance(value, str):
+        try:
+            value = int(value)
+        except ValueError:
+            pass
+    elif isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if type(value) is not int:  # True / False も数字としては扱わない
+        raise ValueError(f"時間は数字で入力して！（{value!r}）")
+    if value < 0:
+        raise ValueError(f"時間は0以上で入力して！（{value}）")
+    return value
+
+
+def _check_text(record, key):
+    value = record.get(key)
+    if not isinstance(value, str):
+        raise ValueError(f"{key} は文字列で入力して！（{value!r}）")
+    return value
+
+
+def _validate(record, day_cache):
+    """記録1件を確かめ、(型をそろえた記録, 日付のキー) を返す
+
+    day_cache は日付の文字列 → (YYYY-MM-DD, period_keys) の表。同じ日付は1回しか解釈しない。
+    墓標の日付のキーは None。
+    """
+    if not isinstance(record, dict):
+        raise ValueError("記録は JSON のオブジェクトで書いて！")
+
+    if record.get("deleted") is True:
+        rid, stamp = record.get("id"), record.get("updated_at")
+        if not isinstance(rid, str) or not rid or not isinstance(stamp, str):
+            raise ValueError("削除の記録には id と updated_at が必要です")
+        return {"id": rid, "deleted": True, "updated_at": stamp}, None
+
+    raw_date = record.get("date")
+    cached = day_cache.get(raw_date) if isinstance(raw_date, str) else None
+    if cached is None:
+        d = parse_date(raw_date)
+        cached = day_cache[raw_date] = (d.isoformat(), period_keys(d))
+    iso, keys = cached
+
+    minutes = record.get("minutes")
+    if type(minutes) is not int or minutes < 0:
+        minutes = parse_minutes(minutes)
+
+    clean = {
+        "date": iso,
+        "category": _check_text(record, "category"),
+        "content": _check_text(record, "content"),
+        "minutes": minutes,
+    }
+    for key in ("id", "updated_at"):
+        if key in record:
+            value = record[key]
+            if not isinstance(value, str) or not value:
+                raise ValueError(f"{key} は空でない文字列にして！")
+            clean[key] = value
+    return clean, keys
+
+
+def validate_record(record):
+    """記録（または墓標）1件を確かめ、型をそろえた新しい辞書を返す
+
+    おかしければ ValueError（メッセージはそのまま画面に出せる）。
+    日付は YYYY-MM-DD に、時間は整数にそろえ、知らない項目は落とす。
+    """
+    return _validate(record, {})[0]
+
+
+def parse_records(entries):
+    """読み込んだ記録・墓標をまとめて確かめる
+
+    (取り込める (記録, 日付のキー) のリスト, 取り込めない (位置, 理由) のリスト) を返す。
+    日付のキーは stats.period_keys の (日, 週, 月) で、集計はこれを使い回す（墓標は None）。
+    """
+    day_cache = {}
+    parsed = []
+    rejected = []
+    for i, entry in enumerate(entries):
+        try:
+            parsed.append(_validate(entry, day_cache))
+        except ValueError as e:
+            rejected.append((i, str(e)))
+    return parsed, rejected
@@ -0,0 +1,177 @@
+# UniLife Optimizer 全文検索
+# 内容・カテゴリを1文字・2文字ずつに区切った転置インデックス（日本語の分かち書き不要）
+
+import json
+import os
+import heapq
+import tempfile
+import unicodedata
+from itertools import accumulate
+
+INDEX_VERSION = 3
+
+
+def index_path_for(path):
+    """記録ファイルに対応するインデックスのパス（data.json → data.index.json）"""
+    return os.path.splitext(path)[0] + ".index.json"
+
+
+def normalize(text):
+    """全角・半角や大文字・小文字の違いをならす"""
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+def record_text(record):
+    """検索対象の文字列（カテゴリと内容）"""
+    return normalize(f"{record['category']}\n{record['content']}")
+
+
+def grams(text):
+    """1文字と2文字の切れ端の集合（空白・改行を含むものは除く）"""
+    result = set()
+    for i, ch in enumerate(text):
+        if ch.isspace():
+            continue
+        result.add(ch)
+        nxt = text[i + 1:i + 2]
+        if nxt and not nxt.isspace():
+            result.add(ch + nxt)
+    return result
+
+
+def query_grams(term):
+    """検索語1つを引くための切れ端（1文字ならその文字、2文字以上なら2文字ずつ）"""
+    if len(term) == 1:
+        return [term]
+    return [term[i:i + 2] for i in range(len(term) - 1)]
+
+
+def _newest_first(record):
+    return record["date"], record.get("updated_at", "")
+
+
+def _gaps(numbers):
+    """小さい順の番号の列を、前との差の列にする（保存するファイルを小さくする）"""
+    return [b - a for a, b in zip([0] + numbers, numbers)]
+
+
+class SearchIndex:
+    """切れ端 → その切れ端を含む記録の番号の集合、の転置インデックス
+
+    記録 ID（32文字）の代わりに、登録した順の番号（doc_ids の位置）を持つ。
+    記録の編集・削除では、古い内容の切れ端から番号を外してから新しい内容で登録し直す
+    （同じ ID には同じ番号を使い続ける）。
+    """
+
+    def __init__(self):
+        self.postings = {}
+        self.doc_ids = []  # 番号 → 記録 ID
+        self._docs = {}  # 記録 ID → 番号
+
+    def _doc(self, rid):
+        doc = self._docs.get(rid)
+        if doc is None:
+            doc = self._docs[rid] = len(self.doc_ids)
+            self.doc_ids.append(rid)
+        return doc
+
+    def add(self, record):
+        """記録を登録する"""
+        doc = self._doc(record["id"])
+        for g in grams(record_text(record)):
+            docs = self.postings.get(g)
+            if docs is None:
+                self.postings[g] = {doc}
+            else:
+                docs.add(doc)
+
+    def remove(self, record):
+        """登録済みの記録を外す（登録したときと同じ内容を渡す）"""
+        doc = self._docs.get(record["id"])
+        if doc is None:
+            return
+        for g in grams(record_text(record)):
+            docs = self.postings.get(g)
+            if docs is not None:
+                docs.discard(doc)
+                if not docs:
+                    del self.postings[g]
+
+    def search(self, query, get_record, limit=None):
+        """空白区切りのすべての語を含む記録を新しい順（日付→更新時刻）に返す
+
+        get_record は ID から今の記録を引く関数。
+        """
+        terms = normalize(query).split()
+        if not terms:
+            return []
+
+        sets = []
+        for term in terms:
+            for g in query_grams(term):
+                docs = self.postings.get(g)
+                if docs is None:
+                    return []
+                sets.append(docs)
+
+        # 一番小さい集合から候補を出し、ほかの集合に含まれるかを確かめる
+        sets.sort(key=len)
+        shortest, rest = sets[0], sets[1:]
+        results = []
+        for doc in shortest:
+            if not all(doc in docs for docs in rest):
+                continue
+            # 2文字ずつ一致しても並びが違うことがあるので、最後に本文で確認
+            record = get_record(self.doc_ids[doc])
+            if record is not None and all(term in record_text(record) for term in terms):
+                results.append(record)
+
+        if limit is not None:
+            return heapq.nlargest(limit, results, key=_newest_first)
+        return sorted(results, key=_newest_first, reverse=True)
+
+    # -------------------------
+    # 保存・読み込み
+    # -------------------------
+    def dump(self):
+        """保存する中身を作る（書き出しはあとで、ロックの外でもできる）
+
+        postings は番号を小さい順に並べ、前との差で持つ。
+        """
+        return {
+            "doc_ids": list(self.doc_ids),
+            "postings": {g: _gaps(sorted(docs)) for g, docs in self.postings.items()},
+        }
+
+    def save(self, path, snapshot, dumped=None):
+        """インデックスをファイルに保存（snapshot はどのスナップショットに対応するかの目印）
+
+        dumped を渡せば、先に dump() で取っておいた中身を書く。
+        検索はどのプロセスからも同時に起こるので、一時ファイルの名前は毎回別にする。
+        """
+        if dumped is None:
+            dumped = self.dump()
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+        with open(fd, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "snapshot": snapshot, **dumped},
+                      f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, snapshot):
+        """保存済みのインデックスを読む（目印が今のスナップショットと違えば None）"""
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            try:
+                saved = json.load(f)
+            except json.JSONDecodeError:
+                return None
+        if saved.get("version") != INDEX_VERSION or saved.get("snapshot") != snapshot:
+            return None
+
+        index = cls()
+        index.doc_ids = saved["doc_ids"]
+        index._docs = {rid: doc for doc, rid in enumerate(index.doc_ids)}
+        index.postings = {g: set(accumulate(gaps)) for g, gaps in saved["postings"].items()}
+        return index
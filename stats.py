@@ -0,0 +1,220 @@
+# UniLife Optimizer カテゴリ別統計とおすすめ
+# 記録が増える・変わる・消えるたびに少しずつ更新し、提案のたびに全件を数え直さない
+
+from datetime import date
+
+
+class CategoryStats:
+    """1カテゴリ分の統計（日ごとの合計時間を持つ）"""
+
+    def __init__(self):
+        self.total = 0
+        self.count = 0
+        self.first_day = None  # 日付の序数（date.toordinal()）
+        self.last_day = None
+        self.daily = {}  # 日付の序数 → その日の合計時間（分）
+        self.day_counts = {}  # 日付の序数 → その日の記録件数
+        self.weekly = {}  # 週のキー → その週の合計時間（分）
+        self.monthly = {}  # 月のキー → その月の合計時間（分）
+
+    def add(self, day, week, month, minutes):
+        """記録1件分を反映する"""
+        self.total += minutes
+        self.count += 1
+        self.daily[day] = self.daily.get(day, 0) + minutes
+        self.day_counts[day] = self.day_counts.get(day, 0) + 1
+        self.weekly[week] = self.weekly.get(week, 0) + minutes
+        self.monthly[month] = self.monthly.get(month, 0) + minutes
+        if self.first_day is None or day < self.first_day:
+            self.first_day = day
+        if self.last_day is None or day > self.last_day:
+            self.last_day = day
+
+    def remove(self, day, week, month, minutes):
+        """記録1件分を取り消す（編集・削除のとき）"""
+        self.total -= minutes
+        self.count -= 1
+        self.weekly[week] -= minutes
+        self.monthly[month] -= minutes
+        self.day_counts[day] -= 1
+        if self.day_counts[day]:
+            self.daily[day] -= minutes
+            return
+
+        # その日の記録がなくなったら日ごとの値も消す
+        del self.day_counts[day]
+        del self.daily[day]
+        if not self.day_counts:
+            self.first_day = self.last_day = None
+        elif day == self.first_day:
+            self.first_day = min(self.day_counts)
+        elif day == self.last_day:
+            self.last_day = max(self.day_counts)
+
+    def rolling(self, today, days):
+        """今日を含む直近 days 日間の合計時間"""
+        return sum(self.daily.get(today - i, 0) for i in range(days))
+
+    def streak(self, today):
+        """今日（今日がまだなら昨日）まで何日連続で記録しているか"""
+        day = today if today in self.day_counts else today - 1
+        n = 0
+        while day in self.day_counts:
+            n += 1
+            day -= 1
+        return n
+
+
+class PeriodTotals:
+    """全カテゴリ合計の件数と時間（日・週・月ごと）"""
+
+    def __init__(self):
+        self.count = 0
+        self.minutes = 0
+        self.day = {}  # キー → [件数, 合計時間]
+        self.week = {}
+        self.month = {}
+
+    def add(self, day, week, month, minutes):
+        """記録1件分を反映する"""
+        self.count += 1
+        self.minutes += minutes
+        for buckets, key in ((self.day, day), (self.week, week), (self.month, month)):
+            bucket = buckets.get(key)
+            if bucket is None:
+                buckets[key] = [1, minutes]
+            else:
+                bucket[0] += 1
+                bucket[1] += minutes
+
+    def remove(self, day, week, month, minutes):
+        """記録1件分を取り消す（件数が0になった区切りは消す）"""
+        self.count -= 1
+        self.minutes -= minutes
+        for buckets, key in ((self.day, day), (self.week, week), (self.month, month)):
+            bucket = buckets[key]
+            bucket[0] -= 1
+            bucket[1] -= minutes
+            if not bucket[0]:
+                del buckets[key]
+
+    def get(self, period, today=None):
+        """期間（"day" / "week" / "month" / "all"）の (件数, 合計時間) を返す"""
+        if period == "all":
+            return self.count, self.minutes
+        day, week, month = period_keys(today or date.today())
+        bucket = {
+            "day": self.day.get(day),
+            "week": self.week.get(week),
+            "month": self.month.get(month),
+        }[period]
+        return tuple(bucket) if bucket else (0, 0)
+
+
+def period_keys(d):
+    """日付から (日, 週, 月) のキーを作る
+
+    日は序数、週は月曜日の序数（月曜はじまり）、月は (年, 月)。
+    """
+    day = d.toordinal()
+    return day, day - d.weekday(), (d.year, d.month)
+
+
+def add_to_stats(stats, totals, record, keys):
+    """記録1件をカテゴリ別統計と期間ごとの合計に反映する
+
+    keys は読み込み時に period_keys で作った (日, 週, 月)（ここで日付を解釈し直さない）。
+    """
+    cat = record["category"]
+    cs = stats.get(cat)
+    if cs is None:
+        cs = stats[cat] = CategoryStats()
+    cs.add(*keys, record["minutes"])
+    totals.add(*keys, record["minutes"])
+
+
+def remove_from_stats(stats, totals, record, keys):
+    """add_to_stats で反映した記録1件を取り消す（keys は反映したときと同じもの）"""
+    cat = record["category"]
+    cs = stats[cat]
+    cs.remove(*keys, record["minutes"])
+    totals.remove(*keys, record["minutes"])
+    if not cs.count:
+        del stats[cat]
+
+
+def recommend(stats, weekly_targets, today=None):
+    """目標に対する不足が大きい順にカテゴリを並べて返す
+
+    目標が未設定のカテゴリは、これまでの平均ペース（1週間あたり）を目標とみなす。
+    目標だけあって記録のないカテゴリも並べる（streak / days_since は None）。
+    1カテゴリあたり日ごとの辞書を30回引くだけなので、記録件数には比例しない。
+    """
+    if today is None:
+        today = date.today()
+    today = today.toordinal()
+
+    ranking = []
+    for cat, cs in stats.items():
+        last7 = cs.rolling(today, 7)
+        last30 = cs.rolling(today, 30)
+        target = weekly_targets.get(cat)
+        has_target = target is not None
+        if not has_target:
+            # 最初の記録からの平均ペース（1週間未満なら1週間とみなす）
+            days = max(today - cs.first_day + 1, 7)
+            target = round(cs.total * 7 / days)
+
+        ranking.append({
+            "category": cat,
+            "target": target,
+            "has_target": has_target,
+            "last7": last7,
+            "last30": last30,
+            "streak": cs.streak(today),
+            "days_since": today - cs.last_day,
+            "deficit": target - last7,
+            "total": cs.total,
+        })
+
+    # 目標だけあってまだ記録のないカテゴリ（不足は目標そのもの）
+    for cat, target in weekly_targets.items():
+        if cat in stats:
+            continue
+        ranking.append({
+            "category": cat,
+            "target": target,
+            "has_target": True,
+            "last7": 0,
+            "last30": 0,
+            "streak": None,
+            "days_since": None,  # 一度も記録していない
+            "deficit": target,
+            "total": 0,
+        })
+
+    # 不足が大きい順、同じなら長くさぼっている順（一度も記録していないものが先）
+    ranking.sort(key=lambda s: (
+        -s["deficit"],
+        -s["days_since"] if s["days_since"] is not None else float("-inf"),
+    ))
+    return ranking
+
+
+def goal_progress(stats, goals, today=None):
+    """目標ごとの進み具合（今週・今月の時間を数え直さず、カウンタを引くだけ）"""
+    _, week, month = period_keys(today or date.today())
+    progress = []
+    for period, key, attr in (("weekly", week, "weekly"), ("monthly", month, "monthly")):
+        for cat, target in goals.get(period, {}).items():
+            cs = stats.get(cat)
+            done = getattr(cs, attr).get(key, 0) if cs else 0
+            progress.append({
+                "category": cat,
+                "period": period,
+                "target": target,
+                "done": done,
+                "remaining": max(target - done, 0),
+                "ratio": done / target if target else 0.0,
+            })
+    return progress
@@ -0,0 +1,854 @@
+# UniLife Optimizer 共通データストア
+# CLI / GUI / Web / Mobile で共有する記録の読み書き
+
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import uuid
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from schema import parse_minutes, parse_records, validate_record
+from search import SearchIndex, index_path_for
+from stats import PeriodTotals, add_to_stats, goal_progress, recommend, remove_from_stats
+
+DATA_FILE = "data.json"
+
+# 目標の種類（週ごと・月ごとの目標時間）
+GOAL_PERIODS = ("weekly", "monthly")
+
+
+def load_snapshot(path=DATA_FILE):
+    """スナップショットを読んで形を確かめ、(取り込める (記録, 日付のキー) のリスト, 報告) を返す
+
+    JSON として読めない・配列になっていないときは、中身ごと報告に入れて空として扱う。
+    """
+    if not os.path.exists(path):
+        return [], []
+
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        text = f.read()
+    if not text.strip():
+        return [], []
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        return [], [_rejected(path, 0, f"JSON として読めない（{e}）", text)]
+    if not isinstance(data, list):
+        return [], [_rejected(path, 0, "記録の配列になっていない", data)]
+    return _validated(data, range(len(data)), path)
+
+
+def save_data(records, path=DATA_FILE):
+    """記録をJSONファイルに保存（一時ファイルに書いてから置き換える）"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(records, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def get_category_sum(records):
+    """カテゴリ別の合計を返す"""
+    category_sum = {}
+    for r in records:
+        cat = r["category"]
+        category_sum[cat] = category_sum.get(cat, 0) + r["minutes"]
+    return category_sum
+
+
+def log_path_for(path):
+    """スナップショットに対応する追記ログのパス（data.json → data.log）"""
+    return os.path.splitext(path)[0] + ".log"
+
+
+def now_stamp():
+    """更新時刻（UTC・マイクロ秒まで。文字列のまま大小比較できる形）"""
+    return datetime.now(timezone.utc).isoformat(timespec="microseconds")
+
+
+def stamp_record(record):
+    """ID のない新しい記録に ID と更新時刻を付ける
+
+    ID があって更新時刻のない記録（古いデータ由来のもの）はそのままにし、一番古い版（""）として扱う。
+    今の時刻を付けると、ほかの端末での編集・削除より新しいことになってしまうため。
+    """
+    if "id" not in record:
+        record["id"] = uuid.uuid4().hex
+        record.setdefault("updated_at", now_stamp())
+    return record
+
+
+def legacy_record_id(record, occurrence):
+    """ID のない古い記録の ID（同じファイルならどの端末でも同じ ID になる）"""
+    payload = json.dumps(
+        [record["date"], record["category"], record["content"], record["minutes"], occurrence],
+        ensure_ascii=False,
+    )
+    return "legacy-" + hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def ensure_id(record, legacy_seen):
+    """ID がなければ古い記録用の ID を付ける（legacy_seen は同じ内容の出現回数）"""
+    if "id" not in record:
+        key = (record["date"], record["category"], record["content"], record["minutes"])
+        n = legacy_seen.get(key, 0)
+        legacy_seen[key] = n + 1
+        record["id"] = legacy_record_id(record, n)
+    return record["id"]
+
+
+def is_newer(entry, current):
+    """同じ ID の2つの版のうち entry の方を残すか（どの端末でも同じ答えになる）
+
+    更新時刻が新しい方を残す。同時刻なら内容で決める（中身が同じなら False）。
+    """
+    a, b = entry.get("updated_at", ""), current.get("updated_at", "")
+    if a != b:
+        return a > b
+    return (json.dumps(entry, sort_keys=True, ensure_ascii=False)
+            > json.dumps(current, sort_keys=True, ensure_ascii=False))
+
+
+def tombstone(record_id):
+    """削除を表すログの1行（墓標）"""
+    return {"id": record_id, "deleted": True, "updated_at": now_stamp()}
+
+
+def _rejected(path, position, reason, entry):
+    """読み込めなかった記録1件の報告（position は配列の位置かログのバイト位置）"""
+    return {
+        "source": os.path.basename(path),
+        "position": position,
+        "reason": reason,
+        "entry": entry,
+        "found_at": now_stamp(),
+    }
+
+
+def _validated(entries, positions, path):
+    """読んだものを schema.parse_records でまとめて確かめ、(取り込めるもの, 報告) を返す"""
+    parsed, bad = parse_records(entries)
+    return parsed, [_rejected(path, positions[i], reason, entries[i]) for i, reason in bad]
+
+
+def _log_entries(log_path, offset=0):
+    """ログの offset バイト目から、書き終わっている行までを読んで形を確かめる
+
+    (取り込める (記録, 日付のキー) のリスト, 読み込めなかったものの報告, 読んだ行数, 読み終えた位置)
+    を返す。
+    """
+    try:
+        with open(log_path, "rb") as f:
+            f.seek(offset)
+            chunk = f.read()
+    except FileNotFoundError:
+        return [], [], 0, offset
+
+    # 書き込み途中の最終行は次回に回す
+    end = chunk.rfind(b"\n") + 1
+    lines = chunk[:end].split(b"\n")[:-1]
+    entries, positions, broken = [], [], []
+    pos = offset
+    for line in lines:
+        if line.strip():
+            try:
+                entries.append(json.loads(line))
+                positions.append(pos)
+            except ValueError:  # JSON として壊れている・文字コードがおかしい
+                broken.append(_rejected(log_path, pos, "JSON として読めない", line.decode("utf-8", "replace")))
+        pos += len(line) + 1
+    parsed, rejected = _validated(entries, positions, log_path)
+    return parsed, broken + rejected, len(lines), offset + end
+
+
+def quarantine_path_for(path):
+    """読み込めなかった記録の隔離先（data.json → data.quarantine.log）"""
+    return os.path.splitext(path)[0] + ".quarantine.log"
+
+
+def _quarantine_key(report):
+    return json.dumps(
+        [report.get("source"), report.get("position"), report.get("entry")],
+        sort_keys=True, ensure_ascii=False,
+    )
+
+
+def quarantine(rejected, path):
+    """読み込めなかった記録を隔離ファイルに1行ずつ書き足す（同じものは2回書かない）
+
+    元の行はスナップショット・ログに残るが、集計には入らず、次のまとめ直しで消える。
+    """
+    if not rejected:
+        return
+    with file_lock(path):
+        seen = set()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        seen.add(_quarantine_key(json.loads(line)))
+                    except json.JSONDecodeError:
+                        continue
+        except FileNotFoundError:
+            pass
+        lines = "".join(
+            json.dumps(r, ensure_ascii=False) + "\n"
+            for r in rejected if _quarantine_key(r) not in seen
+        )
+        if lines:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(lines)
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """プロセスをまたいだ書き込みの順番待ち（path + ".lock" を使う）"""
+    with open(path + ".lock", "a+b") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def append_records(records, path=DATA_FILE):
+    """記録（編集後の版・墓標も含む）をログに追記するだけ（既存の記録は読み込まない）
+
+    先に全件の形を確かめ、1件でもおかしければ ValueError で何も書かない。
+    書いた記録（型をそろえ、ID と更新時刻を付けたもの）のリストを返す。
+    """
+    records = [stamp_record(validate_record(r)) for r in records]
+    lines = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8")
+    with file_lock(path):
+        with open(log_path_for(path), "a+b") as f:
+            # 書きかけの行（落ちたプロセスの残りなど）で終わっていたら、改行で区切ってから書く
+            # （そのままつなげると、こちらの記録まで壊れた行になって読めなくなる）
+            if f.seek(0, os.SEEK_END):
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    lines = b"\n" + lines
+            f.write(lines)
+    return records
+
+
+def read_records(path=DATA_FILE):
+    """スナップショットとログから今の記録だけを読む（集計やインデックスは作らない）
+
+    編集・削除はログの順に当てはめ、削除済みの記録は返さない。
+    形のおかしい記録は隔離ファイルに移す。
+    """
+    latest = {}
+    legacy_seen = {}
+    snapshot, rejected = load_snapshot(path)
+    entries, log_rejected, _, _ = _log_entries(log_path_for(path))
+    quarantine(rejected + log_rejected, quarantine_path_for(path))
+    for entry, _ in snapshot + entries:
+        rid = ensure_id(entry, legacy_seen)
+        current = latest.get(rid)
+        if current is None or is_newer(entry, current):
+            latest[rid] = entry
+    return [r for r in latest.values() if not r.get("deleted")]
+
+
+def meta_path_for(path):
+    """スナップショットの情報ファイル（data.json → data.meta.json）"""
+    return os.path.splitext(path)[0] + ".meta.json"
+
+
+def save_meta(meta, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, path)
+
+
+def load_meta(path):
+    """スナップショットを書いた時点の seq などを読む（なければ空の辞書）"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            return json.load(f)
+        except json.JSONDecodeError:
+            return {}
+
+
+def goals_path_for(path):
+    """記録ファイルに対応する目標ファイルのパス（data.json → data.goals.json）"""
+    return os.path.splitext(path)[0] + ".goals.json"
+
+
+def load_goals(path):
+    """目標ファイルを読み込む（{"weekly": {カテゴリ: 分}, "monthly": {...}}）
+
+    手で書き換えられていても、時間は parse_minutes で整数にそろえ、読めない目標は落とす。
+    """
+    goals = {period: {} for period in GOAL_PERIODS}
+    if not os.path.exists(path):
+        return goals
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            saved = json.load(f)
+        except json.JSONDecodeError:
+            return goals
+    if not isinstance(saved, dict):
+        return goals
+    for period in GOAL_PERIODS:
+        targets = saved.get(period)
+        if not isinstance(targets, dict):
+            continue
+        for category, minutes in targets.items():
+            try:
+                minutes = parse_minutes(minutes)
+            except ValueError:
+                continue
+            if minutes > 0:
+                goals[period][category] = minutes
+    return goals
+
+
+def save_goals(goals, path):
+    """目標をファイルに保存（一時ファイルの名前はプロセスごとに別にする）"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    with open(fd, "w", encoding="utf-8") as f:
+        json.dump(goals, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+class RecordStore:
+    """記録とカテゴリ別集計をメモリ上に1つだけ持つストア
+
+    保存はスナップショット（data.json）と追記ログ（data.log）の2段構え。
+    追加・編集・削除はどれもログに1行足すだけ（編集は新しい版、削除は墓標）。
+    ほかの画面は poll() でログの続きだけを読み、集計は差分で直す。
+    ログがたまったら、裏のスレッドで最新の版と墓標だけをスナップショットにまとめる。
+
+    書き込みは append() / extend() / update() / delete() / merge() だけを通し、
+    ロックで1つずつ順番に処理する。
+    Web のセッションや API のスレッド、裏のまとめ直しが同時に触るので、読み出しも同じロックを取る。
+    records の一覧は snapshot() でコピーを受け取り、category_sum / stats / totals を
+    直接読むときは with store.read(): の中で読む（どれも書き換えないこと）。
+    records の並び順は決まっていない（削除で末尾の記録が空いた位置に移る）。
+
+    読み込み時に schema で形を確かめ、おかしな記録は隔離ファイル（data.quarantine.log）に移して
+    rejected に報告を残す。日付は読み込み時に1回だけ (日, 週, 月) のキーにして持っておく。
+    """
+
+    # ログがこの行数を超えたらスナップショットにまとめる
+    COMPACT_LOG_LINES = 500
+
+    def __init__(self, path=DATA_FILE):
+        self.path = path
+        self.log_path = log_path_for(path)
+        self.prev_log_path = self.log_path + ".1"  # まとめる前のログ（1世代だけ残す）
+        self.meta_path = meta_path_for(path)
+        self.goals_path = goals_path_for(path)
+        self.index_path = index_path_for(path)
+        self.quarantine_path = quarantine_path_for(path)
+        self._lock = threading.RLock()  # 読み書きの両方で取る（中で get() などを呼べるよう再入可）
+        self._listeners = []
+        self._pending = []  # 同期・まとめ直しの途中で取り込んだ変更（次の poll() などで知らせる）
+        self._compacting = False
+        # 読み直しても同じリスト・辞書を使い続ける（読み直しはロックの中で行う）
+        self.records = []
+        self.category_sum = {}
+        self.stats = {}  # カテゴリ → stats.CategoryStats
+        self._pos = {}  # 記録の ID → records の位置
+        self._keys = {}  # 記録の ID → 日付のキー (日, 週, 月)（集計のたびに日付を解釈しない）
+        self._tombstones = {}  # 削除した記録の ID → 墓標
+        self._feed = {}  # ID → 最後に変わったときの seq（変わった順に並ぶ）
+        self._reload()
+
+    # -------------------------
+    # 読み込み
+    # -------------------------
+    def _stat_snapshot(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _reload(self):
+        """スナップショットとログを全部読み直す（起動時・まとめ直し検出時のみ）"""
+        self._search_index = None  # 次の検索で読み直す（_poll_locked は差分で入れ替えて戻す）
+        self.records.clear()
+        self.category_sum.clear()
+        self.stats.clear()
+        self.totals = PeriodTotals()
+        self._pos.clear()
+        self._keys.clear()
+        self._tombstones.clear()
+        self._feed.clear()
+        self._legacy_seen = {}
+        self._log_touched = {}  # ログで変わった ID → スナップショット時点の記録（なければ None）
+        self.rejected = []  # 読み込めずに隔離した記録の報告
+
+        # スナップショットは変わった順に並んでいるので、書いた時点の seq まで順に振り直す
+        # （meta がない古いデータは、先頭から 1, 2, 3... と数える）
+        self._snapshot_mtime = self._stat_snapshot()
+        snapshot, rejected = load_snapshot(self.path)
+        self._quarantine(rejected)
+        self._snapshot_seq = load_meta(self.meta_path).get("seq", len(snapshot))
+        self.seq = self._snapshot_seq - len(snapshot)
+        for entry, keys in snapshot:
+            self._apply(entry, keys)
+        self.seq = max(self.seq, self._snapshot_seq)
+        self._snapshot_size = len(snapshot)
+
+        self._load_goals()
+        self._log_offset = 0
+        self._log_lines = 0
+        self._read_log()
+
+    def _load_goals(self):
+        self.goals = load_goals(self.goals_path)
+        try:
+            self._goals_mtime = os.stat(self.goals_path).st_mtime_ns
+        except FileNotFoundError:
+            self._goals_mtime = None
+
+    def _read_log(self, log_path=None):
+        """ログの前回位置から末尾までを読み、反映した変更 (古い版, 新しい版) のリストを返す"""
+        entries, rejected, lines, self._log_offset = _log_entries(log_path or self.log_path, self._log_offset)
+        self._log_lines += lines
+        self._quarantine(rejected)
+        changes = []
+        for entry, keys in entries:
+            change = self._apply(entry, keys, from_log=True)
+            if change:
+                changes.append(change)
+        return changes
+
+    def _quarantine(self, rejected):
+        if rejected:
+            quarantine(rejected, self.quarantine_path)
+            self.rejected.extend(rejected)
+
+    def _apply(self, entry, keys, from_log=False):
+        """ログ1行（記録の版か墓標）を反映し、(古い版, 新しい版) を返す
+
+        entry と keys は schema.parse_records で確かめ済みのもの（keys は墓標なら None）。
+        同じ ID の版・墓標が既にあれば、新しい方だけを残す（古い・同じ版なら何もせず None）。
+        古い版は集計から引いてから、新しい版を足す。
+        """
+        rid = ensure_id(entry, self._legacy_seen)
+        pos = self._pos.get(rid)
+        current = self.records[pos] if pos is not None else self._tombstones.get(rid)
+        if current is not None and not is_newer(entry, current):
+            return None
+
+        old = None
+        if pos is not None:
+            old = self._remove(rid)
+        if from_log and rid not in self._log_touched:
+            self._log_touched[rid] = old
+
+        if entry.get("deleted"):
+            self._tombstones[rid] = entry
+            new = None
+        else:
+            self._tombstones.pop(rid, None)
+            self._add(entry, keys)
+            new = entry
+
+        # 変わった順を保つため、いったん外して末尾に入れ直す
+        self.seq += 1
+        self._feed.pop(rid, None)
+        self._feed[rid] = self.seq
+        if old is None and new is None:
+            return None  # 知らない記録の墓標（同期で届いたもの）は画面には関係ない
+        return old, new
+
+    def _add(self, record, keys):
+        self._pos[record["id"]] = len(self.records)
+        self._keys[record["id"]] = keys
+        self.records.append(record)
+        cat = record["category"]
+        self.category_sum[cat] = self.category_sum.get(cat, 0) + record["minutes"]
+        add_to_stats(self.stats, self.totals, record, keys)
+        if self._search_index is not None:
+            self._search_index.add(record)
+
+    def _remove(self, rid):
+        """記録を外して集計から引く（末尾の記録を空いた位置に移すので O(1)）"""
+        pos = self._pos.pop(rid)
+        record = self.records[pos]
+        last = self.records.pop()
+        if last is not record:
+            self.records[pos] = last
+            self._pos[last["id"]] = pos
+
+        cat = record["category"]
+        self.category_sum[cat] -= record["minutes"]
+        remove_from_stats(self.stats, self.totals, record, self._keys.pop(rid))
+        if cat not in self.stats:
+            del self.category_sum[cat]
+        if self._search_index is not None:
+            self._search_index.remove(record)
+        return record
+
+    def get(self, record_id):
+        """ID から記録を引く（なければ None）"""
+        with self._lock:
+            pos = self._pos.get(record_id)
+            return self.records[pos] if pos is not None else None
+
+    def read(self):
+        """category_sum / stats / totals をまとめて読むときのロック（with store.read(): ...）
+
+        中で書き込むほかのスレッドを待たせるので、読んだらすぐ抜けること。
+        """
+        return self._lock
+
+    def snapshot(self):
+        """今の記録の一覧のコピー（記録の辞書は書き換えられないので、そのまま使ってよい）"""
+        with self._lock:
+            return list(self.records)
+
+    def subscribe(self, callback):
+        """変更が反映されるたびに callback(変更のリスト) を呼ぶ
+
+        変更は (古い版, 新しい版) の組。追加なら古い版が None、削除なら新しい版が None。
+        """
+        self._listeners.append(callback)
+
+    def poll(self):
+        """ほかの画面・プロセスの変更を取り込み、変更 (古い版, 新しい版) のリストを返す
+
+        普段はログの続きを読むだけ。ほかのプロセスがまとめ直していたら、ログをまとめただけなら
+        位置をずらして続きを読み、それ以外（読み遅れなど）は全部読み直す。
+        """
+        with self._lock:
+            changes = self._take_pending() + self._poll_locked()
+        self._notify(changes)
+        return changes
+
+    def _poll_locked(self):
+        try:
+            log_size = os.path.getsize(self.log_path)
+        except FileNotFoundError:
+            log_size = 0
+
+        try:
+            goals_mtime = os.stat(self.goals_path).st_mtime_ns
+        except FileNotFoundError:
+            goals_mtime = None
+        if goals_mtime != self._goals_mtime:
+            self._load_goals()
+
+        if self._stat_snapshot() != self._snapshot_mtime or log_size < self._log_offset:
+            # ほかのプロセスがまとめ直した（入れ替えの途中を読まないよう、ファイルロックの中で見る）
+            with file_lock(self.path):
+                return self._follow_compaction()
+
+        if log_size == self._log_offset:
+            return []  # 変化なし（stat 1回だけで済む）
+
+        return self._read_log()
+
+    def _follow_compaction(self):
+        """ほかのプロセスのまとめ直しに追いつき、変わった記録を (古い版, 新しい版) のリストで返す
+
+        meta にはまとめる前のスナップショットの seq（base）と、ログをどこまでまとめたか（folded）が
+        書いてある。同じスナップショットからログを folded まで読めば、メモリの中身は新しい
+        スナップショットと同じになる。読み遅れた分はまとめる前のログ（data.log.1）から読み、
+        あとはログの位置をずらして続きを読むだけで済む。
+        そうでなければ（2回以上まとめられた・古い形式の meta など）全部読み直す。
+        """
+        meta = load_meta(self.meta_path)
+        folded = meta.get("folded")
+        followable = (meta.get("base") == self._snapshot_seq
+                      and isinstance(folded, int) and isinstance(meta.get("size"), int))
+        changes = []
+        if followable and self._log_offset < folded:
+            changes = self._read_log(self.prev_log_path)
+        if (followable and 0 <= folded <= self._log_offset
+                and (folded < self._log_offset or meta.get("seq") == self.seq)):
+            self._snapshot_mtime = self._stat_snapshot()
+            self._snapshot_seq = meta["seq"]
+            self._snapshot_size = meta["size"]
+            self._log_offset -= folded
+            self._log_lines = 0
+            # _log_touched はそのまま使える（インデックスに古い切れ端が残っても、検索の最後に本文で確かめる）
+            return changes + self._read_log()
+
+        # 読み直して、変わった ID だけを変更として返す（途中まで読んだ分も、変わる前の版と比べる）
+        before = {r["id"]: r for r in self.records}
+        for old, new in reversed(changes):
+            if new is not None:
+                del before[new["id"]]
+            if old is not None:
+                before[old["id"]] = old
+        index = self._search_index
+        self._reload()
+        changes = [(old, self.get(rid)) for rid, old in before.items() if self.get(rid) != old]
+        changes += [(None, r) for r in self.records if r["id"] not in before]
+        if index is not None:
+            # 検索インデックスは作り直さず、変わった記録だけ入れ替えて使い続ける
+            for old, new in changes:
+                if old is not None:
+                    index.remove(old)
+                if new is not None:
+                    index.add(new)
+            self._search_index = index
+        return changes
+
+    def _take_pending(self):
+        """ほかの入口で取り込んだまま知らせていない変更を取り出す（ロックの中で呼ぶ）"""
+        pending, self._pending = self._pending, []
+        return pending
+
+    def _notify(self, changes):
+        if changes:
+            for callback in self._listeners:
+                callback(changes)
+
+    # -------------------------
+    # 書き込み
+    # -------------------------
+    def append(self, record):
+        """記録を1件ログに追記して取り込む"""
+        self.extend([record])
+
+    def extend(self, records):
+        """複数の記録をまとめてログに追記して取り込む（オフラインでためた分など）
+
+        形のおかしい記録があれば ValueError で、1件も書かない。
+        """
+        with self._lock:
+            changes = self._take_pending() + self._extend_locked(records)
+        self._notify(changes)
+
+    def update(self, record_id, **fields):
+        """記録の一部を書き換える（新しい版をログに足す）。書き換えた記録を返す
+
+        ID がなければ KeyError、書き換えた結果の形がおかしければ ValueError。
+        """
+        with self._lock:
+            changes = self._take_pending() + self._poll_locked()
+            current = self.get(record_id)
+            if current is None:
+                raise KeyError(record_id)
+            record = validate_record(dict(current, **fields))
+            record["updated_at"] = now_stamp()
+            changes += self._extend_locked([record])
+        self._notify(changes)
+        return record
+
+    def delete(self, record_id):
+        """記録を削除する（墓標をログに足す）"""
+        with self._lock:
+            changes = self._take_pending() + self._poll_locked()
+            if self.get(record_id) is None:
+                raise KeyError(record_id)
+            changes += self._extend_locked([tombstone(record_id)])
+        self._notify(changes)
+
+    def merge(self, records):
+        """ほかの端末から受け取った記録・墓標を取り込み、反映された件数を返す
+
+        ID で突き合わせ、こちらより新しい版だけを取り込むので、
+        同じものを何度受け取っても結果は変わらない。ID のない記録は新しい記録として取り込む。
+        形のおかしい記録があれば ValueError で、1件も取り込まない。
+        """
+        records = [stamp_record(validate_record(r)) for r in records]
+        with self._lock:
+            changes = self._take_pending() + self._poll_locked()
+            fresh = {}
+            for r in records:
+                rid = r["id"]
+                current = fresh.get(rid) or self.get(rid) or self._tombstones.get(rid)
+                if current is None or is_newer(r, current):
+                    fresh[rid] = r
+            merged = self._extend_locked(list(fresh.values())) if fresh else []
+        self._notify(changes + merged)
+        return len(merged)
+
+    def _extend_locked(self, records):
+        append_records(records, self.path)
+        changes = self._poll_locked()
+        if self._log_lines >= self.COMPACT_LOG_LINES and not self._compacting:
+            # まとめ直しは裏のスレッドで（画面を止めない）
+            self._compacting = True
+            threading.Thread(target=self._compact_in_background, daemon=True).start()
+        return changes
+
+    def changes_since(self, seq, limit=None):
+        """seq より後に変わった記録・墓標と、次に渡す seq を返す（同期・API の差分用）
+
+        変わった順に後ろから見ていくので、変わった件数ぶんしか見ない。
+        limit 件で打ち切ったときは、返した最後の1件の seq を返す（続きは次の呼び出しで）。
+        """
+        with self._lock:
+            # 取り込んだ変更は画面側に知らせていないので、次の poll() で渡す
+            self._pending += self._poll_locked()
+            rids = []
+            for rid in reversed(self._feed):
+                if self._feed[rid] <= seq:
+                    break
+                rids.append(rid)
+            rids.reverse()
+            next_seq = self.seq
+            if limit is not None and len(rids) > limit:
+                rids = rids[:limit]
+                next_seq = self._feed[rids[-1]] if rids else seq
+            changed = [self.get(rid) or self._tombstones[rid] for rid in rids]
+            return changed, next_seq
+
+    # -------------------------
+    # まとめ直し
+    # -------------------------
+    def compact(self):
+        """ログの内容をスナップショットにまとめ、ログを空にする
+
+        スナップショットには ID ごとの最新の版と墓標だけを、変わった順に書く。
+        中身を書き出している間はロックを取らない（読み書きはそのまま続けられる）。
+        ファイルを入れ替える間だけ、ほかのプロセスの書き込みもファイルロックで待ってもらう。
+        """
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+        self._compact_in_background()
+
+    def _compact_in_background(self):
+        try:
+            self._compact()
+        finally:
+            self._compacting = False
+
+    def _compact(self):
+        with self._lock:
+            # ほかのプロセスが先にまとめていたら、ここで読み直される
+            # 取り込んだ変更は裏のスレッドから画面に知らせず、次の poll() で渡す
+            self._pending += self._poll_locked()
+            entries = [self.get(rid) or self._tombstones[rid] for rid in self._feed]
+            seq, offset, mtime = self.seq, self._log_offset, self._snapshot_mtime
+            base = self._snapshot_seq
+            index = self._search_index
+            dumped = index.dump() if index is not None else None
+
+        # 重い書き出しはロックの外で（一時ファイルの名前はプロセスごとに別にする）
+        fd, data_tmp = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", suffix=".tmp")
+        with open(fd, "w", encoding="utf-8") as f:
+            json.dump(entries, f, indent=2, ensure_ascii=False)
+        snapshot = {e["id"]: e for e in entries}
+
+        with self._lock, file_lock(self.path):
+            if self._snapshot_mtime != mtime or self._stat_snapshot() != mtime:
+                os.remove(data_tmp)  # 書き出している間にほかのプロセスがまとめた
+                return
+
+            # meta を先に書けば、途中で読んだほかのプロセスの seq は大きめになるだけ
+            # （差分が多めに届くだけで取りこぼさない）
+            # base / folded / size は、ほかのプロセスが読み直さずに追いつくための目印
+            save_meta({"seq": seq, "base": base, "folded": offset, "size": len(entries)}, self.meta_path)
+            os.replace(data_tmp, self.path)
+
+            # まとめた位置より後ろ（書き出している間に足された行・書きかけの行）はログに残す
+            with open(self.log_path, "rb") as f:
+                f.seek(offset)
+                rest = f.read()
+            tmp_path = self.log_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(rest)
+            # まとめる前のログは1世代だけ残す（読み遅れたほかのプロセスが続きを読めるように）
+            os.replace(self.log_path, self.prev_log_path)
+            os.replace(tmp_path, self.log_path)
+
+            self._snapshot_mtime = self._stat_snapshot()
+            self._snapshot_seq = seq
+            self._snapshot_size = len(entries)
+            # 書き出している間に読んだ行は、新しいログでは先頭からの位置になる
+            self._log_offset -= offset
+            self._log_lines = rest[:self._log_offset].count(b"\n")
+            # その間に変わった記録は、スナップショット時点の版を覚えておく（インデックスの入れ替え用）
+            self._log_touched = {}
+            for rid in reversed(self._feed):
+                if self._feed[rid] <= seq:
+                    break
+                old = snapshot.get(rid)
+                self._log_touched[rid] = None if old is None or old.get("deleted") else old
+            key = self._snapshot_key()
+
+        if index is not None:
+            index.save(self.index_path, key, dumped)
+
+    # -------------------------
+    # 目標
+    # -------------------------
+    def set_target(self, category, period, minutes):
+        """カテゴリの目標時間を設定して保存する（0以下なら目標を外す）
+
+        ほかのプロセスが書いた目標を消さないよう、ファイルロックの中で読み直してから書き換える。
+        """
+        if period not in GOAL_PERIODS:
+            raise ValueError(f"unknown goal period: {period}")
+        with self._lock, file_lock(self.goals_path):
+            goals = load_goals(self.goals_path)
+            if minutes > 0:
+                goals[period][category] = minutes
+            else:
+                goals[period].pop(category, None)
+            save_goals(goals, self.goals_path)
+            self.goals = goals
+            self._goals_mtime = os.stat(self.goals_path).st_mtime_ns
+
+    # -------------------------
+    # 集計
+    # -------------------------
+    def recommend(self, today=None):
+        """週の目標に対して不足が大きい順のカテゴリ一覧（stats.recommend を参照）"""
+        with self._lock:
+            return recommend(self.stats, self.goals["weekly"], today)
+
+    def goal_progress(self, today=None):
+        """目標ごとの今週・今月の進み具合（stats.goal_progress を参照）"""
+        with self._lock:
+            return goal_progress(self.stats, self.goals, today)
+
+    # -------------------------
+    # 検索
+    # -------------------------
+    def _snapshot_key(self):
+        """保存したインデックスがどのスナップショットのものかの目印"""
+        return [self._snapshot_seq, self._snapshot_size]
+
+    def search(self, query, limit=None):
+        """カテゴリ・内容に query を含む記録を新しい順に返す
+
+        インデックスは最初の検索で読み込み、スナップショット以降にログで変わった
+        記録だけを入れ替える。以降は記録の追加・編集・削除と一緒に更新される。
+        """
+        with self._lock:
+            if self._search_index is None:
+                index = SearchIndex.load(self.index_path, self._snapshot_key())
+                if index is None:
+                    index = SearchIndex()
+                    for record in self.records:
+                        index.add(record)
+                    index.save(self.index_path, self._snapshot_key())
+                else:
+                    for rid, old in self._log_touched.items():
+                        if old is not None:
+                            index.remove(old)
+                        if self.get(rid) is not None:
+                            index.add(self.get(rid))
+                self._search_index = index
+            return self._search_index.search(query, self.get, limit)
@@ -0,0 +1,111 @@
+# UniLife Optimizer 同期
+# 記録の ID で突き合わせ、前回の同期から増えた分だけをやりとりする
+#
+# 相手（peer）は2種類：
+#   - 別の記録ファイル（例：sync_peer.json）…テスト用・USB などでの受け渡し用
+#   - api_server.py の URL（例：http://192.168.0.10:8765）
+
+import json
+import os
+import tempfile
+import urllib.request
+
+from store import DATA_FILE, RecordStore
+
+
+def sync_state_path_for(path):
+    """同期の進み具合を覚えておくファイル（data.json → data.sync.json）"""
+    return os.path.splitext(path)[0] + ".sync.json"
+
+
+def load_sync_state(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            return json.load(f)
+        except json.JSONDecodeError:
+            return {}
+
+
+def save_sync_state(state, path):
+    # 同時に同期したほかのプロセスと一時ファイルがぶつからないよう、名前は毎回別にする
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    with open(fd, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+class FilePeer:
+    """別の記録ファイルを同期相手にする（ローカルの代役）"""
+
+    def __init__(self, path):
+        self.key = os.path.abspath(path)
+        self.store = RecordStore(path)
+
+    def changes_since(self, seq):
+        return self.store.changes_since(seq)
+
+    def push(self, records):
+        self.store.merge(records)
+
+
+class HttpPeer:
+    """api_server.py を同期相手にする"""
+
+    def __init__(self, url, timeout=10):
+        self.key = url.rstrip("/")
+        self.timeout = timeout
+
+    def changes_since(self, seq):
+        with urllib.request.urlopen(f"{self.key}/records?since={seq}", timeout=self.timeout) as resp:
+            data = json.load(resp)
+        return data["records"], data["seq"]
+
+    def push(self, records):
+        body = json.dumps(records, ensure_ascii=False).encode("utf-8")
+        req = urllib.request.Request(
+            f"{self.key}/records",
+            data=body,
+            headers={"Content-Type": "application/json; charset=utf-8"},
+            method="POST",
+        )
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            resp.read()
+
+
+def open_peer(spec):
+    """URL なら HttpPeer、それ以外はファイルとして FilePeer を返す"""
+    if spec.startswith(("http://", "https://")):
+        return HttpPeer(spec)
+    return FilePeer(spec)
+
+
+def sync(store, peer, state_path=None):
+    """store と peer の間で、前回から増えた記録だけを交換する
+
+    送る：こちらの seq が前回より後の記録
+    受け取る：相手の seq が前回より後の記録（ID で突き合わせて新しいものだけ取り込む）
+    戻り値は {"sent": 送った件数, "received": 取り込んだ件数}
+    """
+    state_path = state_path or sync_state_path_for(store.path)
+    state = load_sync_state(state_path)
+    cursor = state.get(peer.key, {"local": 0, "remote": 0})
+
+    outgoing, local_seq = store.changes_since(cursor["local"])
+    if outgoing:
+        peer.push(outgoing)
+
+    incoming, remote_seq = peer.changes_since(cursor["remote"])
+    received = store.merge(incoming) if incoming else 0
+
+    # 受け取った分は次回こちらから送り返すことになるが、相手側で ID が一致して捨てられる。
+    # 同期中にほかの画面が追加した分を取りこぼさないよう、送った時点の seq を覚えておく
+    state[peer.key] = {"local": local_seq, "remote": remote_seq}
+    save_sync_state(state, state_path)
+    return {"sent": len(outgoing), "received": received}
+
+
+def sync_with(spec, path=DATA_FILE):
+    """記録ファイル path と相手 spec を同期する（CLI・Mobile 用の入口）"""
+    return sync(RecordStore(path), open_peer(spec))
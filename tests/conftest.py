@@ -0,0 +1,5 @@
+# モジュールはリポジトリ直下に平置きなので、テストからも import できるようにする
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,126 @@
+# RecordStore：ログの追記・差分の取り出し・まとめ直しの回帰テスト
+
+import json
+import threading
+import time
+
+from store import RecordStore, load_goals
+
+
+def record(content, minutes=30):
+    return {"date": "2026-10-01", "category": "英語", "content": content, "minutes": minutes}
+
+
+def wait_compaction(store):
+    while store._compacting:
+        time.sleep(0.01)
+
+
+def test_torn_last_line_is_terminated_before_append(tmp_path):
+    path = str(tmp_path / "data.json")
+    with open(str(tmp_path / "data.log"), "w", encoding="utf-8") as f:
+        f.write(json.dumps(record("単語")) + "\n")
+        f.write('{"date": "2026-10-01", "cat')  # 落ちたプロセスの書きかけ
+
+    store = RecordStore(path)
+    assert [r["content"] for r in store.records] == ["単語"]
+    store.append(record("文法"))
+    assert sorted(r["content"] for r in store.records) == ["単語", "文法"]
+
+    # 書きかけの行は1行として隔離され、あとから足した記録は読める
+    fresh = RecordStore(path)
+    assert sorted(r["content"] for r in fresh.records) == ["単語", "文法"]
+    assert len(fresh.rejected) == 1
+
+
+def test_changes_since_limit_returns_cursor_of_last_record(tmp_path):
+    store = RecordStore(str(tmp_path / "data.json"))
+    store.extend([record(f"問題{i}") for i in range(5)])
+
+    seen, seq = [], 0
+    while True:
+        changed, seq = store.changes_since(seq, limit=2)
+        if not changed:
+            break
+        assert len(changed) <= 2
+        seen += [r["content"] for r in changed]
+        if len(seen) == 2:
+            # 途中で編集された記録は、続きの最後にもう一度届く
+            store.update(changed[0]["id"], minutes=60)
+    assert seen == ["問題0", "問題1", "問題2", "問題3", "問題4", "問題0"]
+    assert seq == store.seq
+
+
+def test_changes_since_keeps_changes_for_listeners(tmp_path):
+    path = str(tmp_path / "data.json")
+    writer, reader = RecordStore(path), RecordStore(path)
+    notified = []
+    reader.subscribe(notified.extend)
+
+    writer.append(record("単語"))
+    changed, _ = reader.changes_since(0)
+    assert [r["content"] for r in changed] == ["単語"]
+    # changes_since で取り込んだ変更も、次の poll() で画面に知らされる
+    reader.poll()
+    assert [new["content"] for old, new in notified] == ["単語"]
+
+
+def test_concurrent_appends_survive_compaction(tmp_path):
+    path = str(tmp_path / "data.json")
+    # 同じファイルを開いた2つのストア（別々のプロセスの代わり）
+    stores = [RecordStore(path), RecordStore(path)]
+    for store in stores:
+        store.COMPACT_LOG_LINES = 50
+
+    def run(store, name):
+        for i in range(150):
+            store.append(record(f"{name}-{i}"))
+
+    threads = [threading.Thread(target=run, args=(store, f"{n}{t}"))
+               for n, store in enumerate(stores) for t in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for store in stores:
+        wait_compaction(store)
+
+    fresh = RecordStore(path)
+    assert len(fresh.records) == 600
+    assert fresh.rejected == []
+    for store in stores:
+        store.poll()
+        assert len(store.records) == 600
+        assert store.category_sum == {"英語": 600 * 30}
+
+
+def test_other_store_follows_compaction_without_reload(tmp_path, monkeypatch):
+    path = str(tmp_path / "data.json")
+    writer, reader = RecordStore(path), RecordStore(path)
+    writer.extend([record(f"問題{i}") for i in range(20)])
+    reader.poll()
+    assert len(reader.search("問題")) == 20
+
+    def fail():
+        raise AssertionError("reloaded")
+
+    monkeypatch.setattr(reader, "_reload", fail)
+    # reader が読んでいない行が残ったまま、writer がまとめ直す
+    writer.append(record("長文"))
+    writer.delete(writer.search("問題3")[0]["id"])
+    writer.compact()
+    writer.append(record("過去問"))
+
+    reader.poll()
+    assert sorted(r["content"] for r in reader.records) == sorted(r["content"] for r in writer.records)
+    assert len(reader.search("問題")) == 19
+    assert len(reader.search("過去問")) == 1
+    assert reader.seq == writer.seq
+
+
+def test_load_goals_coerces_minutes_and_drops_invalid(tmp_path):
+    path = str(tmp_path / "data.goals.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"weekly": {"IT": "300", "英語": "abc", "数学": -5}, "monthly": ["壊れている"]}, f)
+
+    assert load_goals(path) == {"weekly": {"IT": 300}, "monthly": {}}
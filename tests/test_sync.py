@@ -0,0 +1,52 @@
+# 同期：2つの記録ファイルが、追加・編集・削除をやりとりして同じ中身になるか
+
+from store import RecordStore
+from sync import FilePeer, sync
+
+
+def record(content, minutes=30):
+    return {"date": "2026-10-01", "category": "英語", "content": content, "minutes": minutes}
+
+
+def contents(store):
+    return {r["id"]: (r["content"], r["minutes"]) for r in store.snapshot()}
+
+
+def test_two_stores_converge_with_edits_and_deletes(tmp_path):
+    local = RecordStore(str(tmp_path / "local.json"))
+    peer = FilePeer(str(tmp_path / "peer.json"))
+
+    local.extend([record("単語"), record("文法"), record("長文")])
+    peer.store.extend([record("リスニング"), record("音読")])
+    assert sync(local, peer) == {"sent": 3, "received": 2}
+    assert contents(local) == contents(peer.store)
+
+    # 両側で別々に編集・削除してから同期する
+    by_content = {r["content"]: r["id"] for r in local.snapshot()}
+    local.update(by_content["単語"], minutes=45)
+    local.delete(by_content["文法"])
+    peer.store.update(by_content["音読"], content="シャドーイング")
+    peer.store.delete(by_content["長文"])
+    peer.store.append(record("過去問"))
+
+    sync(local, peer)
+    sync(local, peer)  # 2回目は何も変わらない
+    assert contents(local) == contents(peer.store)
+    assert sorted(c for c, _ in contents(local).values()) == ["シャドーイング", "リスニング", "単語", "過去問"]
+    assert contents(local)[by_content["単語"]] == ("単語", 45)
+
+    # 削除した記録は、古い版が届いても生き返らない
+    assert local.get(by_content["文法"]) is None
+    assert peer.store.get(by_content["文法"]) is None
+
+
+def test_sync_resumes_from_saved_cursor(tmp_path):
+    local = RecordStore(str(tmp_path / "local.json"))
+    peer = FilePeer(str(tmp_path / "peer.json"))
+    local.extend([record("単語"), record("文法")])
+    sync(local, peer)
+
+    local.append(record("長文"))
+    # 前回から増えた1件だけを送る
+    assert sync(local, peer) == {"sent": 1, "received": 0}
+    assert contents(local) == contents(peer.store)
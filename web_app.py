@@ -1,35 +1,18 @@
 import streamlit as st
-import json
-import os
-from datetime import date, datetime, timedelta
+from datetime import date, timedelta
 import matplotlib.pyplot as plt
 import io
 import csv
 
-DATA_FILE = "data.json"
+from store import DATA_FILE, RecordStore, get_category_sum
 
 # -------------------------
 # データ関連
 # -------------------------
-def load_data():
-    if not os.path.exists(DATA_FILE):
-        return []
-    with open(DATA_FILE, "r", encoding="utf-8") as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            return []
-
-def save_data(records):
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(records, f, indent=2, ensure_ascii=False)
-
-def get_category_sum(records):
-    category_sum = {}
-    for r in records:
-        cat = r["category"]
-        category_sum[cat] = category_sum.get(cat, 0) + r["minutes"]
-    return category_sum
+@st.cache_resource
+def get_store():
+    """全セッションで共有するストア（プロセスにつき1つだけ作られる）"""
+    return RecordStore(DATA_FILE)
 
 def records_to_csv(records):
     """記録のリストをCSVバイト列に変換する（Excel向けにCP932でエンコード）"""
@@ -46,6 +29,10 @@ def records_to_csv(records):
     return output.getvalue().encode("cp932")
 
 
+# 表示期間 → store.totals のキー
+PERIOD_TOTAL_KEYS = {"全期間": "all", "今日": "day", "今週": "week", "今月": "month"}
+
+
 def filter_records_by_period(records, period: str):
     """表示期間に応じて記録を絞り込む"""
     if not records:
@@ -56,29 +43,20 @@ def filter_records_by_period(records, period: str):
 
     today = date.today()
 
+    # 日付は読み込み時に YYYY-MM-DD にそろえてあるので、文字列のまま比べられる
     if period == "今日":
         return [r for r in records if r["date"] == today.isoformat()]
 
     if period == "今週":
         # 月曜スタートの今週
         # today.weekday() : 月=0, 日=6
-        week_start = today - timedelta(days=today.weekday())
-        week_end = week_start + timedelta(days=7)
-        def to_date(dstr):
-            return datetime.fromisoformat(dstr).date()
-        return [
-            r for r in records
-            if week_start <= to_date(r["date"]) < week_end
-        ]
+        week_start = (today - timedelta(days=today.weekday())).isoformat()
+        week_end = (today + timedelta(days=7 - today.weekday())).isoformat()
+        return [r for r in records if week_start <= r["date"] < week_end]
 
     if period == "今月":
-        def to_date(dstr):
-            return datetime.fromisoformat(dstr).date()
-        return [
-            r for r in records
-            if to_date(r["date"]).year == today.year
-            and to_date(r["date"]).month == today.month
-        ]
+        month_prefix = today.isoformat()[:8]  # "YYYY-MM-"
+        return [r for r in records if r["date"].startswith(month_prefix)]
 
     # 想定外の文字列が来たときは全期間
     return records
@@ -97,8 +75,14 @@ st.sidebar.title("📚 UniLife Optimizer")
 st.sidebar.write("大学生活の勉強・部活・資格勉強を見える化するツール。")
 st.sidebar.write("CLI / GUI / Web / Mobile の4形態で動作中🔥")
 
-# 生データ（全期間）
-records = load_data()
+# 生データ（全期間）：全セッション共通の1つを参照するだけ
+store = get_store()
+store.poll()  # ほかのプロセス（CLI / GUI など）が追記した分だけ取り込む
+records = store.snapshot()  # ほかのセッションの書き込みで変わらないよう、この実行ではコピーを使う
+if store.rejected:
+    st.sidebar.warning(
+        f"読み込めない記録が {len(store.rejected)} 件ありました（{store.quarantine_path} に移しています）。"
+    )
 
 # 🔥 期間フィルタ（全タブ共通）
 st.sidebar.subheader("📅 表示期間")
@@ -109,15 +93,29 @@ period = st.sidebar.selectbox(
 )
 filtered_records = filter_records_by_period(records, period)
 
-# ざっくり統計（選択期間ベース）
+# ざっくり統計（選択期間ベース・ストアのカウンタを引くだけ）
 st.sidebar.subheader("📈 概要（" + period + "）")
-st.sidebar.write(f"記録件数: {len(filtered_records)} 件")
-if filtered_records:
-    total_minutes = sum(r["minutes"] for r in filtered_records)
+with store.read():
+    record_count, total_minutes = store.totals.get(PERIOD_TOTAL_KEYS[period])
+st.sidebar.write(f"記録件数: {record_count} 件")
+if record_count:
     st.sidebar.write(f"累計時間: {total_minutes} 分")
 else:
     st.sidebar.write("この期間のデータはありません。")
 
+# 目標の進み具合（今週・今月）
+st.sidebar.subheader("🎯 目標の進み具合")
+goal_progress = store.goal_progress()
+if goal_progress:
+    for g in goal_progress:
+        label = "今週" if g["period"] == "weekly" else "今月"
+        st.sidebar.progress(
+            min(g["ratio"], 1.0),
+            text=f"{g['category']}（{label}）: {g['done']} / {g['target']} 分",
+        )
+else:
+    st.sidebar.write("目標はまだありません（「今日の提案」タブで設定できます）。")
+
 
 # -------------------------
 # メインタイトル
@@ -153,9 +151,12 @@ with tab1:
                 "content": content,
                 "minutes": int(minutes),
             }
-            records.append(record)
-            save_data(records)
-            st.success("✅ 記録を保存しました！\n※ 期間フィルタを変更すると今の期間にも反映されます。")
+            try:
+                store.append(record)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                st.success("✅ 記録を保存しました！\n※ 期間フィルタを変更すると今の期間にも反映されます。")
         else:
             st.error("カテゴリと内容は必須です。")
 
@@ -166,6 +167,18 @@ with tab1:
 with tab2:
     st.header("📋 記録一覧")
 
+    # キーワード検索（全期間が対象・転置インデックスで引く）
+    query = st.text_input("🔍 キーワードで検索（カテゴリ・内容／空白区切りで絞り込み）")
+    if query:
+        results = store.search(query, limit=100)
+        st.caption(f"「{query}」の検索結果：{len(results)} 件（全期間・新しい順・最大100件）")
+        for r in results:
+            st.write(
+                f"{r['date']} | {r['category']} | "
+                f"{r['content']} | {r['minutes']}分"
+            )
+        st.markdown("---")
+
     if filtered_records:
         # 新しい順に表示
         sorted_records = sorted(filtered_records, key=lambda r: r["date"], reverse=True)
@@ -185,6 +198,56 @@ with tab2:
             file_name=f"unilife_records_{period}.csv",
             mime="text/csv",
         )
+
+        # 記録の編集・削除（ID で1件を引いて書き換える）
+        with st.expander("✏️ 記録を編集・削除"):
+            target = st.selectbox(
+                "編集する記録",
+                sorted_records,
+                format_func=lambda r: f"{r['date']} | {r['category']} | {r['content']} | {r['minutes']}分",
+            )
+            # 選んだ記録ごとに入力欄を作り直し、今の値を初期値にする
+            rid = target["id"]
+            col1, col2 = st.columns(2)
+            with col1:
+                edit_category = st.text_input("カテゴリ", value=target["category"], key=f"edit_cat_{rid}")
+                edit_content = st.text_input("内容", value=target["content"], key=f"edit_content_{rid}")
+            with col2:
+                edit_minutes = st.number_input(
+                    "時間（分）", min_value=0, step=10, value=target["minutes"], key=f"edit_min_{rid}"
+                )
+                edit_date = st.date_input(
+                    "日付", value=date.fromisoformat(target["date"]), key=f"edit_date_{rid}"
+                )
+
+            col_save, col_delete = st.columns(2)
+            with col_save:
+                if st.button("変更を保存", key=f"edit_save_{rid}"):
+                    if edit_category and edit_content:
+                        try:
+                            store.update(
+                                rid,
+                                date=edit_date.isoformat(),
+                                category=edit_category,
+                                content=edit_content,
+                                minutes=int(edit_minutes),
+                            )
+                        except (KeyError, ValueError) as e:
+                            st.error(f"更新できませんでした：{e}")
+                        else:
+                            st.success("✅ 記録を更新しました！")
+                            st.rerun()
+                    else:
+                        st.error("カテゴリと内容は必須です。")
+            with col_delete:
+                if st.button("🗑️ この記録を削除", key=f"edit_delete_{rid}"):
+                    try:
+                        store.delete(rid)
+                    except KeyError as e:
+                        st.error(f"削除できませんでした：{e}")
+                    else:
+                        st.success("記録を削除しました。")
+                        st.rerun()
     else:
         st.write(f"{period} の範囲には記録がありません。")
 
@@ -198,7 +261,11 @@ with tab3:
     if not filtered_records:
         st.write(f"{period} のデータがありません。")
     else:
-        category_sum = get_category_sum(filtered_records)
+        if period == "全期間":
+            with store.read():
+                category_sum = dict(store.category_sum)
+        else:
+            category_sum = get_category_sum(filtered_records)
 
         graph_type = st.radio(
             "グラフの種類を選んでください",
@@ -229,31 +296,37 @@ with tab3:
 
 
 # -------------------------
-# タブ4：今日の提案（期間フィルタ反映）
+# タブ4：今日の提案（直近7日・30日の統計と週の目標から判断）
 # -------------------------
 with tab4:
     st.header("🎯 今日やるべきことの提案")
 
-    if not filtered_records:
-        st.write(f"{period} の範囲でまだ記録がありません。まずは何か1つ記録してみよう。")
+    if not records:
+        st.write("まだ記録がありません。まずは何か1つ記録してみよう。")
     else:
-        category_sum = get_category_sum(filtered_records)
-
-        # 一番時間が少ないカテゴリを探す
-        least_cat = min(category_sum, key=category_sum.get)
-        least_minutes = category_sum[least_cat]
+        # 週の目標に対して不足が大きい順（目標なしのカテゴリはふだんのペースと比べる）
+        ranking = store.recommend()
+        top = ranking[0]
+        least_cat = top["category"]
 
         col1, col2 = st.columns(2)
 
         with col1:
-            st.subheader(f"カテゴリ別 累計時間（{period}）")
-            for cat, mins in category_sum.items():
-                st.write(f"- {cat}: {mins} 分")
+            st.subheader("カテゴリ別 直近7日（不足が大きい順）")
+            for row in ranking:
+                mark = "目標" if row["has_target"] else "ふだん"
+                # 目標だけあってまだ記録のないカテゴリは streak / days_since が None
+                streak = f" / {row['streak']}日連続🔥" if (row["streak"] or 0) >= 2 else ""
+                last = "まだ記録なし" if row["days_since"] is None else f"{row['days_since']}日前"
+                st.write(
+                    f"- {row['category']}: {row['last7']} / {row['target']} 分（{mark}）"
+                    f" | 30日: {row['last30']} 分 | 最終: {last}{streak}"
+                )
 
         with col2:
-            st.subheader("一番使えていないカテゴリ")
+            st.subheader("いま一番足りていないカテゴリ")
             st.metric(label="カテゴリ", value=least_cat)
-            st.metric(label="累計時間（分）", value=least_minutes)
+            st.metric(label="今週あと（分）", value=max(top["deficit"], 0))
 
         st.markdown("---")
         st.subheader("💡 今日のおすすめアクション")
@@ -280,6 +353,19 @@ with tab4:
             )
 
         st.caption(
-            "※ 選択中の期間（サイドバーの表示期間）に基づいて、"
-            "カテゴリ別累計から一番弱いところを探しています。"
+            "※ 直近7日の時間を週の目標（未設定ならこれまでの平均ペース）と比べて、"
+            "一番足りていないところを探しています。表示期間の影響は受けません。"
         )
+
+        # 目標時間の設定（週・月）
+        with st.expander("🎯 目標時間を設定"):
+            goal_cat = st.selectbox("カテゴリ", [row["category"] for row in ranking])
+            goal_label = st.radio("目標の単位", ["週", "月"], horizontal=True)
+            goal_period = "weekly" if goal_label == "週" else "monthly"
+            current = store.goals[goal_period].get(goal_cat, 0)
+            goal_minutes = st.number_input(
+                f"{goal_label}の目標時間（分・0で解除）", min_value=0, step=30, value=current
+            )
+            if st.button("目標を保存"):
+                store.set_target(goal_cat, goal_period, int(goal_minutes))
+                st.success("✅ 目標を保存しました！")